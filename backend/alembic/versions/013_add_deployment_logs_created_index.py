@@ -0,0 +1,29 @@
+"""add deployment_logs (deployment_id, created_at) index
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Composite index serves both the deployment filter and the time ordering
+    op.create_index(
+        'ix_deployment_logs_deployment_created',
+        'deployment_logs',
+        ['deployment_id', 'created_at'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_deployment_logs_deployment_created', table_name='deployment_logs')
@@ -2,10 +2,12 @@
 import asyncio
 import hashlib
 import logging
+import os
 import tempfile
 from pathlib import Path
 from typing import cast
 
+import aiofiles
 from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Request, UploadFile, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
@@ -14,6 +16,9 @@ from sqlalchemy.orm import Session
 _background_tasks: dict[int, asyncio.Task] = {}
 logger = logging.getLogger(__name__)
 
+# 上传文件每次读取/写入的块大小
+_UPLOAD_CHUNK_SIZE = 1 << 20
+
 from app.models.audit_log import AuditAction
 from app.core.permissions import Permission
 from app.db.session import get_db
@@ -47,26 +52,48 @@ def get_current_operator(
     return current_user
 
 
+# 各项目类型允许上传的扩展名及不匹配时的提示
+_ALLOWED_UPLOAD_EXTENSIONS: dict[ProjectType, frozenset[str]] = {
+    ProjectType.JAVA: frozenset({".jar"}),
+    ProjectType.FRONTEND: frozenset({".zip"}),
+}
+_UPLOAD_EXTENSION_ERRORS: dict[ProjectType, str] = {
+    ProjectType.JAVA: "Java项目请上传.jar文件",
+    ProjectType.FRONTEND: "前端项目请上传.zip压缩包",
+}
+
+
 def validate_upload_file(project_type: ProjectType, filename: str) -> None:
-    """验证上传文件类型"""
-    if project_type == ProjectType.JAVA:
-        if not filename.endswith('.jar'):
-            raise HTTPException(
-                status_code=400,
-                detail="Java项目请上传.jar文件"
-            )
-    elif project_type == ProjectType.FRONTEND:
-        if not filename.endswith('.zip'):
-            raise HTTPException(
-                status_code=400,
-                detail="前端项目请上传.zip压缩包"
-            )
-    else:
+    """验证上传文件类型（扩展名不区分大小写）"""
+    allowed = _ALLOWED_UPLOAD_EXTENSIONS.get(project_type)
+    if allowed is None:
         raise HTTPException(
             status_code=400,
             detail=f"不支持的项目类型: {project_type}"
         )
 
+    if os.path.splitext(filename)[1].lower() not in allowed:
+        raise HTTPException(
+            status_code=400,
+            detail=_UPLOAD_EXTENSION_ERRORS[project_type]
+        )
+
+
+async def save_upload_file(file: UploadFile, dest: Path) -> tuple[int, str]:
+    """分块将上传文件写入磁盘，同时计算 SHA256
+
+    Returns:
+        (文件大小, SHA256 十六进制摘要)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    async with aiofiles.open(dest, "wb") as out:
+        while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+            await out.write(chunk)
+    return size, hasher.hexdigest()
+
 
 @router.get("", response_model=list[DeploymentResponse])
 async def list_deployments(
@@ -473,8 +500,8 @@ async def create_upload_deployment(
     current_user: User = Depends(get_current_operator),
 ) -> Deployment:
     """创建上传部署包类型的部署任务"""
-    # 解析服务器组ID列表
-    group_ids = [int(gid.strip()) for gid in server_group_ids.split(',')]
+    # 解析服务器组ID列表（去重并保持顺序）
+    group_ids = list(dict.fromkeys(int(gid.strip()) for gid in server_group_ids.split(',')))
 
     # 验证项目存在
     project = db.query(Project).filter(Project.id == project_id).first()
@@ -484,16 +511,18 @@ async def create_upload_deployment(
     # 验证文件类型（在读取文件内容之前，避免昂贵的I/O操作）
     validate_upload_file(project.project_type, file.filename)
 
-    # 验证服务器组
-    server_groups = []
+    # 验证服务器组：一次 IN 查询取回全部分组
+    groups_by_id = {
+        group.id: group
+        for group in db.query(ServerGroup).filter(ServerGroup.id.in_(group_ids)).all()
+    }
     for group_id in group_ids:
-        group = db.query(ServerGroup).filter(ServerGroup.id == group_id).first()
-        if not group:
+        if group_id not in groups_by_id:
             raise HTTPException(
                 status_code=404,
                 detail=f"服务器组 {group_id} 不存在"
             )
-        server_groups.append(group)
+    server_groups = [groups_by_id[group_id] for group_id in group_ids]
 
     # 验证环境一致性
     EnvironmentService.validate_deployment_environment(project, server_groups)
@@ -502,9 +531,6 @@ async def create_upload_deployment(
     temp_dir = Path(tempfile.gettempdir()) / "deployments"
     temp_dir.mkdir(parents=True, exist_ok=True)
 
-    # 读取文件内容
-    content = await file.read()
-
     # 创建部署记录
     deployment = Deployment(
         project_id=project_id,
@@ -518,27 +544,27 @@ async def create_upload_deployment(
     db.add(deployment)
     db.commit()
 
-    # 保存上传文件
+    # 分块保存上传文件，避免整个部署包驻留内存
     temp_file_path = temp_dir / f"{deployment.id}_{file.filename}"
-    temp_file_path.write_bytes(content)
+    file_size, checksum = await save_upload_file(file, temp_file_path)
 
     # 创建 artifact 记录
-    checksum = hashlib.sha256(content).hexdigest()
     artifact = DeploymentArtifact(
         deployment_id=deployment.id,
         file_path=str(temp_file_path),
-        file_size=len(content),
+        file_size=file_size,
         checksum=checksum,
     )
     db.add(artifact)
 
-    # 关联服务器组
-    for group_id in group_ids:
-        mapping = deployment_server_mappings.insert().values(
-            deployment_id=deployment.id,
-            server_group_id=group_id
-        )
-        db.execute(mapping)
+    # 关联服务器组（单次 executemany）
+    db.execute(
+        deployment_server_mappings.insert(),
+        [
+            {"deployment_id": deployment.id, "server_group_id": group_id}
+            for group_id in group_ids
+        ],
+    )
 
     db.commit()
 
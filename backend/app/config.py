@@ -49,8 +49,12 @@ class Settings(BaseSettings):
 
     # Deployment
     max_concurrent_deployments: int = 5
+    max_parallel_servers: int = 10  # 同一服务器组内并发部署的服务器数
     build_timeout_seconds: int = 3600  # 1 hour
     ssh_timeout_seconds: int = 300  # 5 minutes
+    ssh_pool_idle_seconds: int = 60  # 空闲 SSH 连接保留时长，0 表示不复用
+    # 目标服务器上按 SHA256 缓存部署产物的目录，留空表示不启用
+    remote_artifact_cache_dir: str = ""
     # 日志详细度: "minimal" (仅关键节点) 或 "detailed" (完整日志)
     deployment_log_verbosity: Literal["minimal", "detailed"] = "minimal"
 
@@ -1,11 +1,16 @@
 """SSH connection management."""
 import asyncio
 import io
+import mmap
+import os
+import select
+import socket
+import threading
 import time
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Generator
+from typing import Any, AsyncGenerator, Callable, Generator, Protocol
 
 from paramiko import (
     AutoAddPolicy,
@@ -21,9 +26,16 @@ from app.config import settings
 from app.core.security import decrypt_data
 from app.models.server import AuthType, Server
 
+# SFTP 单次写入的最大数据量（与 paramiko 默认包大小一致）
+_SFTP_CHUNK_SIZE = 32768
 
-class SSHLogger:
-    """Logger interface for SSH operations."""
+
+class SSHLogger(Protocol):
+    """Logger interface for SSH operations.
+
+    Any object with async info/error methods (e.g. DeploymentLogger)
+    satisfies it, so no adapter is needed.
+    """
 
     async def info(self, message: str) -> None:
         """Log info message."""
@@ -38,8 +50,22 @@ class NoOpSSHLogger(SSHLogger):
     """No-op logger implementation when no logger is provided."""
 
 
-def _run_async(coro) -> None:
-    """Run async function in sync context."""
+def _run_async(coro, owner_loop: asyncio.AbstractEventLoop | None = None) -> None:
+    """Run async function in sync context.
+
+    Args:
+        coro: Coroutine to run
+        owner_loop: Event loop the logger belongs to; used when called from
+            a worker thread (e.g. via asyncio.to_thread)
+    """
+    if owner_loop is not None and owner_loop.is_running():
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Worker thread: hand the coroutine back to the owning loop
+            asyncio.run_coroutine_threadsafe(coro, owner_loop)
+            return
+
     try:
         loop = asyncio.get_event_loop()
         if loop.is_running():
@@ -59,6 +85,9 @@ class SSHConfig:
     username: str
     auth_type: AuthType
     auth_value: str  # Encrypted password or key
+    read_buffer_size: int = 65536  # 流式执行时每次 recv 读取的最大字节数
+    command_idle_timeout: float = 300.0  # 流式执行时无任何输出的最长秒数
+    compress: bool = False  # 协商 zlib 传输压缩（文本类部署包收益明显）
 
     def decrypt_auth(self) -> str:
         """Decrypt authentication value.
@@ -69,6 +98,41 @@ class SSHConfig:
         return decrypt_data(self.auth_value)
 
 
+class _LineBuffer:
+    """Split received bytes into lines and pass each one to a callback."""
+
+    def __init__(self, callback: Callable[[str], None] | None) -> None:
+        self._callback = callback
+        self._pending = bytearray()
+        self.lines: list[str] = []
+
+    def feed(self, data: bytes) -> None:
+        """Consume a received chunk, emitting every complete line in it."""
+        end = data.rfind(b"\n")
+        if end < 0:
+            # No line ends here (e.g. \r-driven progress bars): extend the
+            # partial line in place instead of re-copying it per chunk
+            self._pending += data
+            return
+
+        self._pending += data[:end]
+        for raw in self._pending.split(b"\n"):
+            self._emit(raw)
+        self._pending = bytearray(data[end + 1:])
+
+    def flush(self) -> None:
+        """Emit the trailing line that was not terminated by a newline."""
+        if self._pending:
+            self._emit(self._pending)
+            self._pending = bytearray()
+
+    def _emit(self, raw: bytes | bytearray) -> None:
+        line_text = raw.decode("utf-8", errors="replace").rstrip("\r")
+        self.lines.append(line_text)
+        if self._callback and line_text:
+            self._callback(line_text)
+
+
 class SSHConnectionError(Exception):
     """SSH connection error."""
 
@@ -88,12 +152,42 @@ class SSHConnection:
         self.config = config
         self.client: SSHClient | None = None
         self.sftp: SFTPClient | None = None
+        self.bind_logger(logger)
+
+    def bind_logger(self, logger: SSHLogger | None) -> None:
+        """Send this connection's logs to a logger on the calling event loop.
+
+        Args:
+            logger: Logger for SSH operations, or None to drop logs
+        """
         self._logger = logger or NoOpSSHLogger()
+        # Remember the caller's loop so logs from worker threads land there
+        try:
+            self._loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def is_active(self) -> bool:
+        """Check whether the underlying SSH transport is still open.
+
+        Returns:
+            True if connected and the transport is active
+        """
+        transport = self.client.get_transport() if self.client else None
+        return transport is not None and transport.is_active()
+
+    def _log_async(self, coro) -> None:
+        """Dispatch a logger coroutine from sync code.
+
+        Args:
+            coro: Logger coroutine to run
+        """
+        _run_async(coro, self._loop)
 
     def connect(self) -> None:
         """Establish SSH connection."""
         # Log connection start
-        _run_async(
+        self._log_async(
             self._logger.info(
                 f"正在连接到服务器 {self.config.host}:{self.config.port}，用户 {self.config.username}"
             )
@@ -108,9 +202,9 @@ class SSHConnection:
             # Log authentication method (仅 detailed 模式)
             if settings.deployment_log_verbosity == "detailed":
                 if self.config.auth_type == AuthType.PASSWORD:
-                    _run_async(self._logger.info("使用 密码 认证"))
+                    self._log_async(self._logger.info("使用 密码 认证"))
                 else:  # SSH_KEY
-                    _run_async(self._logger.info("使用 SSH密钥 认证"))
+                    self._log_async(self._logger.info("使用 SSH密钥 认证"))
 
             if self.config.auth_type == AuthType.PASSWORD:
                 self.client.connect(
@@ -119,6 +213,7 @@ class SSHConnection:
                     username=self.config.username,
                     password=auth_value,
                     timeout=30,
+                    compress=self.config.compress,
                 )
             else:  # SSH_KEY
                 # Handle key-based authentication
@@ -138,6 +233,7 @@ class SSHConnection:
                         username=self.config.username,
                         key_filename=key_file,
                         timeout=30,
+                        compress=self.config.compress,
                     )
                 finally:
                     # Clean up temp key file
@@ -145,16 +241,16 @@ class SSHConnection:
                         Path(key_file).unlink()
 
             # Log successful connection
-            _run_async(self._logger.info(f"已连接到服务器 {self.config.host}"))
+            self._log_async(self._logger.info(f"已连接到服务器 {self.config.host}"))
 
         except AuthenticationException as e:
-            _run_async(self._logger.error(f"SSH 连接失败: 认证失败 - {e}"))
+            self._log_async(self._logger.error(f"SSH 连接失败: 认证失败 - {e}"))
             raise SSHConnectionError(f"SSH authentication failed: {e}") from e
         except SSHException as e:
-            _run_async(self._logger.error(f"SSH 连接失败: {e}"))
+            self._log_async(self._logger.error(f"SSH 连接失败: {e}"))
             raise SSHConnectionError(f"SSH connection error: {e}") from e
         except OSError as e:
-            _run_async(self._logger.error(f"SSH 连接失败: 网络错误 - {e}"))
+            self._log_async(self._logger.error(f"SSH 连接失败: 网络错误 - {e}"))
             raise SSHConnectionError(f"Network error: {e}") from e
 
     def execute_command(self, command: str) -> tuple[int, str, str]:
@@ -186,6 +282,8 @@ class SSHConnection:
 
         This method provides real-time output streaming for long-running commands.
         Callback functions are invoked for each line of output as it is received.
+        Output is read in chunks of ``config.read_buffer_size`` bytes and split
+        into lines locally.
 
         Args:
             command: Command to execute
@@ -194,40 +292,55 @@ class SSHConnection:
 
         Returns:
             Tuple of (exit_code, full_stdout, full_stderr)
+
+        Raises:
+            socket.timeout: If the command produces no output and does not
+                exit for ``config.command_idle_timeout`` seconds
         """
         if not self.client:
             raise SSHConnectionError("Not connected to SSH server")
 
-        stdin, stdout, stderr = self.client.exec_command(command, timeout=300)
+        idle_timeout = self.config.command_idle_timeout
+        channel = self.client.get_transport().open_session()
+        channel.settimeout(idle_timeout)
+        channel.exec_command(command)
+
+        # 按块读取输出，在本地拆分行，避免每行一次阻塞读取
+        bufsize = self.config.read_buffer_size
+        stdout_lines = _LineBuffer(on_stdout)
+        stderr_lines = _LineBuffer(on_stderr)
+
+        # Drain both streams as data arrives until the command has exited
+        # and nothing is left buffered. recv() only runs once data is ready,
+        # so the channel timeout never fires; track idleness here instead
+        last_activity = time.monotonic()
+        while not (
+            channel.exit_status_ready()
+            and not channel.recv_ready()
+            and not channel.recv_stderr_ready()
+        ):
+            idle = time.monotonic() - last_activity
+            if idle >= idle_timeout:
+                channel.close()
+                raise socket.timeout(
+                    f"Command produced no output for {idle_timeout:g}s: {command}"
+                )
+
+            select.select([channel], [], [], min(1.0, idle_timeout - idle))
+            while channel.recv_ready():
+                stdout_lines.feed(channel.recv(bufsize))
+                last_activity = time.monotonic()
+            while channel.recv_stderr_ready():
+                stderr_lines.feed(channel.recv_stderr(bufsize))
+                last_activity = time.monotonic()
 
-        # Collect full output for return value
-        full_stdout = []
-        full_stderr = []
-
-        # Read stdout line by line with streaming callback
-        while True:
-            line = stdout.readline()
-            if not line:
-                break
-            line_text = line.rstrip("\n\r")
-            full_stdout.append(line_text)
-            if on_stdout and line_text:
-                on_stdout(line_text)
-
-        # Read stderr line by line with streaming callback
-        while True:
-            line = stderr.readline()
-            if not line:
-                break
-            line_text = line.rstrip("\n\r")
-            full_stderr.append(line_text)
-            if on_stderr and line_text:
-                on_stderr(line_text)
+        stdout_lines.flush()
+        stderr_lines.flush()
 
         # Wait for command to finish and get exit code
-        exit_code = stdout.channel.recv_exit_status()
+        exit_code = channel.recv_exit_status()
 
-        return exit_code, "\n".join(full_stdout), "\n".join(full_stderr)
+        return exit_code, "\n".join(stdout_lines.lines), "\n".join(stderr_lines.lines)
 
     def upload_file(self, local_path: str | Path, remote_path: str | Path) -> None:
         """Upload a file to the remote server.
@@ -239,10 +352,36 @@ class SSHConnection:
         if not self.client:
             raise SSHConnectionError("Not connected to SSH server")
 
+        self._put_file(local_path, remote_path)
+
+    def _put_file(
+        self,
+        local_path: str | Path,
+        remote_path: str | Path,
+        callback: Callable[[int, int], None] | None = None,
+    ) -> None:
+        """Stream a local file to the remote path over SFTP.
+
+        putfo writes with pipelined requests, so packets are not acknowledged
+        one by one. The post-upload stat (``confirm``) is skipped to save a
+        round trip; callers verify the artifact when they unpack it.
+
+        Args:
+            local_path: Local file path
+            remote_path: Remote file path
+            callback: Optional progress callback (transferred, total)
+        """
         if not self.sftp:
             self.sftp = self.client.open_sftp()
 
-        self.sftp.put(str(local_path), str(remote_path))
+        with open(local_path, "rb") as fo:
+            self.sftp.putfo(
+                fo,
+                str(remote_path),
+                file_size=os.fstat(fo.fileno()).st_size,
+                callback=callback,
+                confirm=False,
+            )
 
     def upload_file_with_progress(
         self,
@@ -258,16 +397,13 @@ class SSHConnection:
         if not self.client:
             raise SSHConnectionError("Not connected to SSH server")
 
-        if not self.sftp:
-            self.sftp = self.client.open_sftp()
-
         local_path = Path(local_path)
         filename = local_path.name
         file_size = local_path.stat().st_size
         size_mb = file_size / (1024 * 1024)
 
         # Log upload start
-        _run_async(
+        self._log_async(
             self._logger.info(f"开始上传 {filename} (文件大小: {size_mb:.2f} MB)")
         )
 
@@ -289,7 +425,7 @@ class SSHConnection:
 
                 # Log every 10% progress
                 if progress >= last_progress + 10 or progress == 100:
-                    _run_async(
+                    self._log_async(
                         self._logger.info(
                             f"上传进度: {progress}% ({transferred_mb:.2f}/{total_mb:.2f} MB)"
                         )
@@ -298,12 +434,12 @@ class SSHConnection:
 
             try:
                 # Use put with callback for progress tracking
-                self.sftp.put(str(local_path), str(remote_path), callback=progress_callback)
+                self._put_file(local_path, remote_path, callback=progress_callback)
 
                 # Log upload complete
                 duration = time.time() - start_time
                 speed_mb = size_mb / duration if duration > 0 else 0
-                _run_async(
+                self._log_async(
                     self._logger.info(
                         f"上传完成 (耗时: {duration:.2f}秒, 速度: {speed_mb:.2f} MB/s)"
                     )
@@ -313,7 +449,7 @@ class SSHConnection:
                 # Log upload error
                 duration = time.time() - start_time
                 transferred_mb = (last_progress / 100) * size_mb
-                _run_async(
+                self._log_async(
                     self._logger.error(
                         f"上传失败: {e} (已传输: {transferred_mb:.2f} MB)"
                     )
@@ -322,11 +458,11 @@ class SSHConnection:
         else:
             # 简化模式：直接上传，无进度回调
             try:
-                self.sftp.put(str(local_path), str(remote_path))
+                self._put_file(local_path, remote_path)
 
                 # Log upload complete
                 duration = time.time() - start_time
-                _run_async(
+                self._log_async(
                     self._logger.info(
                         f"上传完成 (耗时: {duration:.1f}秒)"
                     )
@@ -334,7 +470,7 @@ class SSHConnection:
 
             except Exception as e:
                 # Log upload error
-                _run_async(
+                self._log_async(
                     self._logger.error(f"上传失败: {e}")
                 )
                 raise
@@ -356,6 +492,29 @@ class SSHConnection:
             fileobj.seek(0)
             remote_file.write(fileobj.read())
 
+    def upload_bytes(
+        self, data: bytes | memoryview | mmap.mmap, remote_path: str | Path
+    ) -> None:
+        """Upload an in-memory buffer to the remote server.
+
+        The buffer is only read, so a single mmap of an artifact can be
+        shared by several connections uploading at the same time.
+
+        Args:
+            data: Bytes-like object (bytes, memoryview or mmap) to upload
+            remote_path: Remote file path
+        """
+        if not self.client:
+            raise SSHConnectionError("Not connected to SSH server")
+
+        if not self.sftp:
+            self.sftp = self.client.open_sftp()
+
+        with memoryview(data) as view, self.sftp.file(str(remote_path), "wb") as remote_file:
+            remote_file.set_pipelined(True)
+            for offset in range(0, len(view), _SFTP_CHUNK_SIZE):
+                remote_file.write(bytes(view[offset:offset + _SFTP_CHUNK_SIZE]))
+
     def download_file(self, remote_path: str | Path, local_path: str | Path) -> None:
         """Download a file from the remote server.
 
@@ -428,13 +587,14 @@ class SSHConnection:
 
 
 def create_ssh_connection(
-    server: Server, logger: SSHLogger | None = None
+    server: Server, logger: SSHLogger | None = None, compress: bool = False
 ) -> SSHConnection:
     """Create SSH connection from Server model.
 
     Args:
         server: Server model instance
         logger: Optional logger for SSH operations
+        compress: Whether to negotiate SSH transport compression
 
     Returns:
         SSH connection instance
@@ -445,10 +605,134 @@ def create_ssh_connection(
         username=server.username,
         auth_type=server.auth_type,
         auth_value=server.auth_value,
+        compress=compress,
     )
     return SSHConnection(config, logger=logger)
 
 
+class SSHConnectionPool:
+    """Pool of idle SSH connections keyed by (host, port, username, compress).
+
+    A connection is lent to one caller at a time and returned only after
+    it was used without error, so later deployments to the same server
+    skip the SSH handshake. Idle connections expire after
+    ``idle_seconds`` and are swept whenever the pool is used. A plain
+    threading lock guards the pool because deployments run on
+    worker-thread event loops.
+    """
+
+    def __init__(self, idle_seconds: float) -> None:
+        """Initialize the pool.
+
+        Args:
+            idle_seconds: How long an unused connection is kept open
+        """
+        self.idle_seconds = idle_seconds
+        self._idle: dict[tuple[str, int, str, bool], list[tuple[SSHConnection, float]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(server: Server, compress: bool) -> tuple[str, int, str, bool]:
+        """Build the pool key for a server.
+
+        Compression is negotiated at handshake time, so compressed and
+        plain connections to the same server are pooled separately.
+        """
+        return (server.host, server.port, server.username, compress)
+
+    def _sweep(self, now: float) -> list[SSHConnection]:
+        """Remove expired idle connections; caller must hold the lock."""
+        expired = []
+        for key, entries in list(self._idle.items()):
+            fresh = []
+            for conn, last_used in entries:
+                if now - last_used < self.idle_seconds:
+                    fresh.append((conn, last_used))
+                else:
+                    expired.append(conn)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+        return expired
+
+    def _checkout(self, server: Server, compress: bool) -> SSHConnection | None:
+        """Take a live idle connection for the server, if any."""
+        with self._lock:
+            stale = self._sweep(time.monotonic())
+            entries = self._idle.get(self._key(server, compress), [])
+            conn = entries.pop()[0] if entries else None
+
+        for expired in stale:
+            expired.close()
+
+        if conn is not None and not conn.is_active():
+            conn.close()
+            return None
+        return conn
+
+    def _checkin(self, server: Server, conn: SSHConnection, compress: bool) -> None:
+        """Return a healthy connection to the pool."""
+        if self.idle_seconds <= 0 or not conn.is_active():
+            conn.close()
+            return
+
+        # Don't keep the finished deployment's logger alive
+        conn.bind_logger(None)
+        with self._lock:
+            self._idle.setdefault(self._key(server, compress), []).append(
+                (conn, time.monotonic())
+            )
+
+    @asynccontextmanager
+    async def acquire(
+        self, server: Server, logger: SSHLogger | None = None, compress: bool = False
+    ) -> AsyncGenerator[SSHConnection, None]:
+        """Borrow a connected SSH connection for a server.
+
+        The handshake for a new connection runs in a worker thread. The
+        connection is closed instead of returned if the block raises.
+
+        Args:
+            server: Server model instance
+            logger: Optional logger for SSH operations
+            compress: Whether the connection negotiates transport compression
+
+        Yields:
+            Connected SSH connection
+        """
+        conn = self._checkout(server, compress)
+        if conn is not None:
+            conn.bind_logger(logger)
+        else:
+            conn = create_ssh_connection(server, logger=logger, compress=compress)
+            try:
+                await asyncio.to_thread(conn.connect)
+            except BaseException:
+                conn.close()
+                raise
+
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+
+        self._checkin(server, conn, compress)
+
+    def close_all(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle = [conn for entries in self._idle.values() for conn, _ in entries]
+            self._idle.clear()
+
+        for conn in idle:
+            conn.close()
+
+
+ssh_pool = SSHConnectionPool(settings.ssh_pool_idle_seconds)
+
+
 @contextmanager
 def ssh_connect(server: Server) -> Generator[SSHConnection, None, None]:
     """Context manager for SSH connection.
@@ -7,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import deployments, projects, servers, users
 from app.api.auth import router as auth_router
 from app.config import settings
+from app.core.ssh import ssh_pool
 from app.db.session import ensure_directories, init_db
 
 
@@ -27,7 +28,7 @@ async def lifespan(app: FastAPI):
     yield
 
     # Shutdown
-    pass
+    ssh_pool.close_all()
 
 
 # Create FastAPI application
@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING
 from sqlalchemy import (
     Column,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
@@ -165,5 +166,9 @@ class DeploymentLog(Base, TimestampMixin):
         "Deployment", back_populates="logs", lazy="selectin"
     )
 
+    __table_args__ = (
+        Index("ix_deployment_logs_deployment_created", "deployment_id", "created_at"),
+    )
+
     def __repr__(self) -> str:
         return f"<DeploymentLog(id={self.id}, deployment_id={self.deployment_id}, level='{self.level}')>"
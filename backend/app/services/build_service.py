@@ -6,6 +6,7 @@ import shutil
 import zipfile
 from dataclasses import dataclass
 from enum import Enum
+from operator import itemgetter
 from pathlib import Path
 from typing import TYPE_CHECKING, Callable
 
@@ -80,6 +81,8 @@ class BuildService:
         self.auto_install = auto_install
         self.project_id = project_id
         self._cancelled = False
+        # These inputs don't change after construction, so resolve once
+        self._install_command = self._compute_install_command()
 
     def cancel(self) -> None:
         """Cancel the build."""
@@ -175,6 +178,14 @@ class BuildService:
     def _get_install_command(self) -> str | None:
         """Get the dependency installation command.
 
+        Returns:
+            Install command string or None if no installation needed
+        """
+        return self._install_command
+
+    def _compute_install_command(self) -> str | None:
+        """Resolve the dependency installation command.
+
         Returns:
             Install command string or None if no installation needed
         """
@@ -526,13 +537,9 @@ class BuildService:
         Returns:
             Hexadecimal checksum string
         """
-        sha256 = hashlib.sha256()
-
+        # file_digest 在 C 层用预分配缓冲区循环读取，避免逐块创建 bytes 对象
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                sha256.update(chunk)
-
-        return sha256.hexdigest()
+            return hashlib.file_digest(f, "sha256").hexdigest()
 
 
 def cleanup_artifacts(
@@ -553,26 +560,30 @@ def cleanup_artifacts(
     if not artifacts_dir.exists():
         return
 
-    # Get all artifacts with their stats
+    # Get all artifacts with their stats (one directory scan, no glob matching)
     artifacts = []
-    for artifact_path in artifacts_dir.glob("artifact_*.zip"):
-        try:
-            stat = artifact_path.stat()
+    with os.scandir(artifacts_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if not (name.startswith("artifact_") and name.endswith(".zip")):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # Skip files that can't be accessed
+                continue
             artifacts.append({
-                "path": artifact_path,
+                "path": Path(entry.path),
                 "mtime": stat.st_mtime,
                 "size": stat.st_size,
-                "name": artifact_path.name,
+                "name": name,
             })
-        except OSError:
-            # Skip files that can't be accessed
-            continue
 
     if not artifacts:
         return
 
     # Sort by modification time (newest first)
-    artifacts.sort(key=lambda x: x["mtime"], reverse=True)
+    artifacts.sort(key=itemgetter("mtime"), reverse=True)
 
     # Group by project if project_id is specified
     if project_id is not None:
@@ -1,6 +1,7 @@
 """Deployment service for orchestrating deployments."""
 import asyncio
 import os
+import shlex
 from datetime import datetime
 from pathlib import Path
 from typing import Callable
@@ -8,7 +9,7 @@ from typing import Callable
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.core.ssh import SSHConnection, SSHLogger, create_ssh_connection
+from app.core.ssh import SSHConnection, create_ssh_connection, ssh_pool
 from app.models.deployment import Deployment, DeploymentStatus, DeploymentType
 from app.models.project import ProjectType
 from app.models.server import Server, ServerGroup
@@ -16,7 +17,8 @@ from app.models.user import User
 from app.services.build_service import BuildService, BuildError
 from app.services.git_service import GitError, GitService, git_context
 from app.services.health_check_service import HealthCheckError, perform_health_check
-from app.services.log_service import DeploymentLogger, LogLevel
+from app.services.log_service import CommandOutputLogger, DeploymentLogger, LogLevel
+from app.services.server_rollout import run_on_server_groups
 from app.utils.script_utils import get_script_execution_info
 
 
@@ -97,26 +99,6 @@ class DeploymentError(Exception):
     pass
 
 
-class _DeploymentSSHLoggerAdapter(SSHLogger):
-    """Adapter to connect DeploymentLogger with SSHLogger interface."""
-
-    def __init__(self, deployment_logger: DeploymentLogger):
-        """Initialize adapter.
-
-        Args:
-            deployment_logger: Deployment logger instance
-        """
-        self._logger = deployment_logger
-
-    async def info(self, message: str) -> None:
-        """Log info message."""
-        await self._logger.info(message)
-
-    async def error(self, message: str) -> None:
-        """Log error message."""
-        await self._logger.error(message)
-
-
 class DeploymentService:
     """Service for orchestrating deployments."""
 
@@ -163,6 +145,9 @@ class DeploymentService:
             await self._update_status(DeploymentStatus.FAILED, str(e))
             await self.logger.error(f"Deployment failed: {e}")
             raise DeploymentError(f"Deployment failed: {e}") from e
+        finally:
+            # Stop the background log writer and persist pending logs
+            await self.logger.close()
 
     async def _full_deploy(self) -> None:
         """Execute full deployment process (clone, build, deploy).
@@ -191,7 +176,7 @@ class DeploymentService:
 
         # Step 3: Deploy to servers
         await self._update_status(DeploymentStatus.DEPLOYING)
-        await self._deploy_to_servers(artifact_info["path"])
+        await self._deploy_to_servers(artifact_info["path"], artifact_info["checksum"])
 
         if self._cancelled:
             await self._handle_cancel()
@@ -256,7 +241,7 @@ class DeploymentService:
 
             # Step 1: Deploy to servers (skip clone and build)
             await self._update_status(DeploymentStatus.DEPLOYING)
-            await self._deploy_to_servers(Path(artifact.file_path))
+            await self._deploy_to_servers(Path(artifact.file_path), artifact.checksum)
 
             if self._cancelled:
                 await self._handle_cancel()
@@ -358,52 +343,65 @@ class DeploymentService:
             self.db.add(artifact)
             self.db.commit()
 
-            return {"path": result.artifact_path, "size": result.artifact_size}
+            return {
+                "path": result.artifact_path,
+                "size": result.artifact_size,
+                "checksum": result.checksum,
+            }
 
         finally:
             # Clean up
-            git_service.cleanup()
+            await git_service.cleanup_async()
             import shutil
 
             shutil.rmtree(work_dir, ignore_errors=True)
 
-    async def _deploy_to_servers(self, artifact_path: Path) -> None:
+    async def _deploy_to_servers(
+        self, artifact_path: Path, checksum: str | None = None
+    ) -> None:
         """Deploy artifact to all servers in server groups.
 
+        Servers within a group are deployed concurrently; groups are
+        deployed in order (see ``run_on_server_groups``).
+
         Args:
             artifact_path: Path to deployment artifact
+            checksum: SHA256 of the artifact, used for the remote cache
         """
         server_groups = self.deployment.server_groups
 
         await self.logger.info(f"Deploying to {len(server_groups)} server group(s)")
 
-        for group in server_groups:
-            await self.logger.info(f"Deploying to server group: {group.name}")
-
-            for server in group.servers:
-                if not server.is_active:
-                    await self.logger.warning(f"Skipping inactive server: {server.name}")
-                    continue
-
-                await self._deploy_to_server(server, artifact_path)
+        await run_on_server_groups(
+            server_groups,
+            lambda server: self._deploy_to_server(server, artifact_path, checksum),
+            self.logger,
+        )
 
-    async def _deploy_to_server(self, server: Server, artifact_path: Path) -> None:
+    async def _deploy_to_server(
+        self, server: Server, artifact_path: Path, checksum: str | None = None
+    ) -> None:
         """Deploy artifact to a single server.
 
         Args:
             server: Server to deploy to
             artifact_path: Path to deployment artifact
+            checksum: SHA256 of the artifact, used for the remote cache
         """
         await self.logger.info(f"部署到服务器: {server.name}")
+        project = self.deployment.project
 
         try:
-            # Create SSH logger adapter
-            ssh_logger = _DeploymentSSHLoggerAdapter(self.logger)
-            conn = create_ssh_connection(server, logger=ssh_logger)
-
-            with conn:
+            # Reuse a warm connection when this server was used recently.
+            # Paramiko calls block, so they run in worker threads to let
+            # servers in the same group overlap. Frontend bundles are mostly
+            # text and compress well; JARs are already deflated
+            async with ssh_pool.acquire(
+                server,
+                logger=self.logger,
+                compress=project.project_type == ProjectType.FRONTEND,
+            ) as conn:
                 # Upload artifact to project's upload_path
-                project = self.deployment.project
                 upload_path = project.upload_path
                 if not upload_path:
                     raise DeploymentError("项目未配置 upload_path，无法部署")
@@ -414,21 +412,21 @@ class DeploymentService:
 
                 # 根据项目类型选择部署策略
                 if project.project_type == ProjectType.FRONTEND:
-                    await self._deploy_frontend_to_server(conn, server, upload_path, artifact_path)
+                    await self._deploy_frontend_to_server(conn, server, upload_path, artifact_path, checksum)
                 else:
-                    await self._deploy_backend_to_server(conn, server, upload_path, artifact_path)
+                    await self._deploy_backend_to_server(conn, server, upload_path, artifact_path, checksum)
 
                 # Execute restart script
                 if project.restart_script_path:
                     # Get script execution info
                     exec_info = get_script_execution_info(project.restart_script_path)
 
-                    await self.logger.info(f"工作目录: {exec_info['working_dir']}")
-                    await self.logger.info(f"执行脚本: {exec_info['script_name']}")
+                    await self.logger.info(f"工作目录: {exec_info.working_dir}")
+                    await self.logger.info(f"执行脚本: {exec_info.script_name}")
 
                     # minimal 模式下不 streaming 输出
                     if settings.deployment_log_verbosity == "minimal":
-                        exit_code, stdout, stderr = conn.execute_command(exec_info['command'])
+                        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, exec_info.command)
                         if exit_code != 0:
                             # 失败时显示完整输出
                             await self.logger.error(f"重启脚本执行失败 (退出码: {exit_code})")
@@ -439,17 +437,15 @@ class DeploymentService:
                             await self.logger.info("重启脚本执行成功")
                     else:
                         # 详细模式：streaming 输出
-                        await self.logger.info(f"执行命令: {exec_info['command']}")
-
-                        exit_code, stdout, stderr = conn.execute_command_streaming(
-                            exec_info['command'],
-                            on_stdout=lambda line: asyncio.create_task(
-                                self.logger.info(f"[stdout] {line}")
-                            ),
-                            on_stderr=lambda line: asyncio.create_task(
-                                self.logger.info(f"[stderr] {line}")
-                            ),
-                        )
+                        await self.logger.info(f"执行命令: {exec_info.command}")
+
+                        async with CommandOutputLogger(self.logger) as output:
+                            exit_code, stdout, stderr = await asyncio.to_thread(
+                                conn.execute_command_streaming,
+                                exec_info.command,
+                                on_stdout=output.stdout,
+                                on_stderr=output.stderr,
+                            )
 
                         if exit_code != 0:
                             await self.logger.error(f"脚本执行完成，退出码: {exit_code}")
@@ -465,12 +461,63 @@ class DeploymentService:
         except Exception as e:
             raise DeploymentError(f"Failed to deploy to {server.name}: {e}") from e
 
+    async def _upload_artifact(
+        self,
+        conn: SSHConnection,
+        artifact_path: Path,
+        remote_artifact: str,
+        checksum: str | None,
+    ) -> None:
+        """Place the artifact at ``remote_artifact`` on the server.
+
+        With ``settings.remote_artifact_cache_dir`` set, artifacts are kept on
+        the server under their SHA256. A cache hit is copied into place
+        remotely and nothing is transferred; a miss is uploaded into the
+        cache once and then copied.
+
+        Args:
+            conn: SSH connection
+            artifact_path: Local artifact path
+            remote_artifact: Remote destination path
+            checksum: SHA256 of the artifact, or None to always upload
+        """
+        cache_dir = settings.remote_artifact_cache_dir
+        if not cache_dir or not checksum:
+            await asyncio.to_thread(conn.upload_file, artifact_path, remote_artifact)
+            return
+
+        cached = f"{cache_dir.rstrip('/')}/{checksum}"
+        if await asyncio.to_thread(conn.file_exists, cached):
+            await self.logger.info(f"命中服务器产物缓存: {cached}")
+        else:
+            exit_code, stdout, stderr = await asyncio.to_thread(
+                conn.execute_command, f"mkdir -p {shlex.quote(cache_dir)}"
+            )
+            if exit_code != 0:
+                raise DeploymentError(f"Failed to create artifact cache directory: {stderr}")
+
+            # 先写临时文件再改名，避免并发部署读到未传完的缓存
+            partial = f"{cached}.part"
+            await asyncio.to_thread(conn.upload_file, artifact_path, partial)
+            exit_code, stdout, stderr = await asyncio.to_thread(
+                conn.execute_command, f"mv -f {shlex.quote(partial)} {shlex.quote(cached)}"
+            )
+            if exit_code != 0:
+                raise DeploymentError(f"Failed to store artifact in cache: {stderr}")
+
+        exit_code, stdout, stderr = await asyncio.to_thread(
+            conn.execute_command, f"cp -f {shlex.quote(cached)} {shlex.quote(remote_artifact)}"
+        )
+        if exit_code != 0:
+            raise DeploymentError(f"Failed to copy cached artifact: {stderr}")
+
     async def _deploy_backend_to_server(
         self,
         conn: SSHConnection,
         server: Server,
         upload_path: str,
         artifact_path: Path,
+        checksum: str | None = None,
     ) -> None:
         """Deploy backend/java project to server.
 
@@ -482,6 +529,7 @@ class DeploymentService:
             server: Target server
             upload_path: Remote upload path
             artifact_path: Local artifact path
+            checksum: SHA256 of the artifact, used for the remote cache
         """
         remote_artifact = f"{upload_path}/{artifact_path.name}"
 
@@ -489,13 +537,13 @@ class DeploymentService:
 
         # Ensure upload directory exists
         mkdir_command = f"mkdir -p {upload_path}"
-        exit_code, stdout, stderr = conn.execute_command(mkdir_command)
+        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, mkdir_command)
         if exit_code != 0:
             await self.logger.error(f"创建上传目录失败: {stderr}")
             raise DeploymentError(f"Failed to create upload directory: {stderr}")
 
         # Upload artifact
-        conn.upload_file(artifact_path, remote_artifact)
+        await self._upload_artifact(conn, artifact_path, remote_artifact, checksum)
         await self.logger.info(f"部署产物上传完成: {remote_artifact}")
 
         # 判断文件类型，jar 不需要解压
@@ -505,7 +553,7 @@ class DeploymentService:
             # 解压zip包到upload_path目录
             await self.logger.info(f"解压部署产物到: {upload_path}")
             unzip_command = f"unzip -o {remote_artifact} -d {upload_path}"
-            exit_code, stdout, stderr = conn.execute_command(unzip_command)
+            exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, unzip_command)
             if exit_code != 0:
                 await self.logger.error(f"解压失败: {stderr}")
                 raise DeploymentError(f"Failed to unzip artifact: {stderr}")
@@ -517,6 +565,7 @@ class DeploymentService:
         server: Server,
         upload_path: str,
         artifact_path: Path,
+        checksum: str | None = None,
     ) -> None:
         """Deploy frontend project to server with backup mechanism.
 
@@ -531,6 +580,7 @@ class DeploymentService:
             server: Target server
             upload_path: Remote upload path (e.g., /application/web/admin)
             artifact_path: Local artifact path
+            checksum: SHA256 of the artifact, used for the remote cache
         """
         # 计算父目录和备份路径
         parent_dir = os.path.dirname(upload_path)
@@ -553,7 +603,7 @@ class DeploymentService:
         # 1. 创建父目录
         await self.logger.info(f"创建父目录: {parent_dir}")
         mkdir_command = f"mkdir -p {parent_dir}"
-        exit_code, stdout, stderr = conn.execute_command(mkdir_command)
+        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, mkdir_command)
         if exit_code != 0:
             await self.logger.error(f"创建父目录失败: {stderr}")
             raise DeploymentError(f"Failed to create parent directory: {stderr}")
@@ -561,7 +611,7 @@ class DeploymentService:
         # 2. 上传zip到父目录
         remote_artifact = f"{parent_dir}/{artifact_path.name}"
         await self.logger.info(f"上传部署产物到父目录: {remote_artifact}")
-        conn.upload_file(artifact_path, remote_artifact)
+        await self._upload_artifact(conn, artifact_path, remote_artifact, checksum)
         await self.logger.info("部署产物上传完成")
 
         # 3. 备份现有目录（如果存在）
@@ -571,18 +621,18 @@ class DeploymentService:
         if settings.deployment_log_verbosity == "detailed":
             await self.logger.info(f"执行备份命令: {backup_command}")
 
-        exit_code, stdout, stderr = conn.execute_command(backup_command)
+        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, backup_command)
         if exit_code != 0:
             await self.logger.error(f"备份失败: {stderr}")
             # 清理已上传的zip文件
             await self.logger.warning("备份失败，清理已上传的文件")
             cleanup_command = f"rm -f {remote_artifact}"
-            conn.execute_command(cleanup_command)
+            await asyncio.to_thread(conn.execute_command, cleanup_command)
             raise DeploymentError(f"备份失败，已中止部署: {stderr}")
 
         # 检查是否真的执行了备份（通过检查备份目录是否存在）
         check_backup_command = f"[ -d \"{backup_path}\" ] && echo \"EXISTS\" || echo \"NOT_EXISTS\""
-        exit_code, stdout, stderr = conn.execute_command(check_backup_command)
+        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, check_backup_command)
         backup_exists = stdout.strip() == "EXISTS"
 
         if backup_exists:
@@ -597,7 +647,7 @@ class DeploymentService:
         if settings.deployment_log_verbosity == "detailed":
             await self.logger.info(f"执行解压命令: {unzip_command}")
 
-        exit_code, stdout, stderr = conn.execute_command(unzip_command)
+        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, unzip_command)
         if exit_code != 0:
             await self.logger.error(f"解压失败: {stderr}")
 
@@ -605,7 +655,7 @@ class DeploymentService:
             if backup_exists:
                 await self.logger.warning(f"解压失败，尝试恢复备份: {backup_path} -> {upload_path}")
                 restore_command = f"mv \"{backup_path}\" \"{upload_path}\""
-                exit_code_restore, stdout_restore, stderr_restore = conn.execute_command(restore_command)
+                exit_code_restore, stdout_restore, stderr_restore = await asyncio.to_thread(conn.execute_command, restore_command)
                 if exit_code_restore == 0:
                     await self.logger.info("备份恢复成功")
                 else:
@@ -617,7 +667,7 @@ class DeploymentService:
             # 清理zip文件
             await self.logger.warning("清理已上传的zip文件")
             cleanup_command = f"rm -f {remote_artifact}"
-            conn.execute_command(cleanup_command)
+            await asyncio.to_thread(conn.execute_command, cleanup_command)
 
             raise DeploymentError(f"解压失败，已中止部署: {stderr}")
 
@@ -626,7 +676,7 @@ class DeploymentService:
         # 5. 清理zip文件
         await self.logger.info(f"清理zip文件: {remote_artifact}")
         cleanup_command = f"rm -f {remote_artifact}"
-        exit_code, stdout, stderr = conn.execute_command(cleanup_command)
+        exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, cleanup_command)
         if exit_code != 0:
             await self.logger.warning(f"清理zip文件失败（不影响部署）: {stderr}")
         else:
@@ -688,14 +738,14 @@ class DeploymentService:
                 self.deployment.project.restart_only_script_path
             )
 
-            await self.logger.info(f"工作目录: {exec_info['working_dir']}")
-            await self.logger.info(f"执行脚本: {exec_info['script_name']}")
+            await self.logger.info(f"工作目录: {exec_info.working_dir}")
+            await self.logger.info(f"执行脚本: {exec_info.script_name}")
 
             conn = create_ssh_connection(server)
 
             with conn:
-                await self.logger.info(f"执行命令: {exec_info['command']}")
-                exit_code, stdout, stderr = conn.execute_command(exec_info['command'])
+                await self.logger.info(f"执行命令: {exec_info.command}")
+                exit_code, stdout, stderr = conn.execute_command(exec_info.command)
 
                 if exit_code != 0:
                     raise DeploymentError(f"重启脚本执行失败: {stderr}")
@@ -732,8 +782,7 @@ class DeploymentService:
 
                 try:
                     # Create SSH connection for command checks
-                    ssh_logger = _DeploymentSSHLoggerAdapter(self.logger)
-                    conn = create_ssh_connection(server, logger=ssh_logger)
+                    conn = create_ssh_connection(server, logger=self.logger)
 
                     with conn:
                         # Perform health check
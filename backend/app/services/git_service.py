@@ -1,18 +1,20 @@
 """Git service for repository operations."""
 import asyncio
+import hashlib
 import os
+import re
 import shutil
+import subprocess
 import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from typing import TYPE_CHECKING, Generator
+from urllib.parse import urlparse, urlunparse
 
-from git import (
-    Actor,
-    GitCommandError,
-    Repo,
-)
+from git import GitCommandError
 
 from app.config import settings
 
@@ -22,6 +24,108 @@ if TYPE_CHECKING:
 # Disable SSL verification for Git (for self-signed certificates)
 os.environ['GIT_SSL_NO_VERIFY'] = '1'
 
+# URL and ref prefixes, built once at import time
+_HTTP = "http"
+_SSH_PREFIXES = ("git@", "ssh://")
+_REFS_HEADS = "refs/heads/"
+_REFS_REMOTES = "refs/remotes/"
+_REFS_REMOTES_ORIGIN = "refs/remotes/origin/"
+_PUBLIC_GIT_HOSTS = (
+    "github.com", "gitlab.com", "gitea.com", "bitbucket.org",
+    "git.github.com", "gitlab.io",
+)
+# Matches URLs that carry embedded credentials (user[:pass]@host)
+_AUTH_PROBE = re.compile(r"://[^/]*@")
+
+# Parallel unlink settings for removing large working trees
+_RMTREE_WORKERS = 8
+_RMTREE_BATCH_SIZE = 512
+
+
+def _run_git(command: list[str], env: dict | None = None) -> str:
+    """Run a git command directly and return its stdout.
+
+    Args:
+        command: Full command line, starting with "git"
+        env: Extra environment variables merged over os.environ
+
+    Returns:
+        Captured stdout
+
+    Raises:
+        GitCommandError: If the command exits with a non-zero status
+    """
+    try:
+        result = subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, **env} if env else None,
+        )
+    except subprocess.CalledProcessError as e:
+        raise GitCommandError(command, e.returncode, e.stderr, e.stdout) from e
+    return result.stdout
+
+
+def _unlink_batch(paths: list[str]) -> None:
+    """Unlink a batch of files, ignoring errors.
+
+    Args:
+        paths: File paths to remove
+    """
+    for file_path in paths:
+        try:
+            os.unlink(file_path)
+        except OSError:
+            pass
+
+
+def _fast_rmtree(path: Path) -> None:
+    """Remove a directory tree, unlinking files concurrently.
+
+    Walks the tree with os.scandir, unlinks files across a thread pool and
+    then removes directories leaves-first. Errors are ignored, matching
+    shutil.rmtree(ignore_errors=True). Falls back to shutil.rmtree on Windows.
+
+    Args:
+        path: Directory to remove
+    """
+    if os.name == "nt":
+        shutil.rmtree(path, ignore_errors=True)
+        return
+
+    files: list[str] = []
+    dirs: list[str] = []
+    stack = [str(path)]
+    while stack:
+        current = stack.pop()
+        dirs.append(current)
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        files.append(entry.path)
+        except OSError:
+            continue
+
+    if files:
+        batches = [
+            files[i:i + _RMTREE_BATCH_SIZE]
+            for i in range(0, len(files), _RMTREE_BATCH_SIZE)
+        ]
+        with ThreadPoolExecutor(max_workers=_RMTREE_WORKERS) as executor:
+            list(executor.map(_unlink_batch, batches))
+
+    # Parents are recorded before their children, so reverse order is leaves-first
+    for directory in reversed(dirs):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
 
 @dataclass
 class GitInfo:
@@ -72,8 +176,9 @@ class GitService:
         self.git_username = git_username
         self.git_password = git_password
         self.logger = logger
-        self.repo: Repo | None = None
         self.repo_path: Path | None = None
+        self._single_branch = False
+        self._cache_key: str | None = None
         self._ssh_key_file: Path | None = None
         self._credential_file: Path | None = None
         self._askpass_file: Path | None = None
@@ -91,26 +196,15 @@ class GitService:
         Returns:
             Prepared Git URL
         """
-        from urllib.parse import urlparse, urlunparse
-
-        # Only modify HTTPS URLs
-        if not self.original_git_url.startswith('http'):
-            return self.original_git_url
-
-        # For SSH URLs, don't modify (inline check)
-        if (self.original_git_url.startswith('git@') or
-            self.original_git_url.startswith('ssh://') or
-            (':' in self.original_git_url and not self.original_git_url.startswith('http'))):
+        # Only modify HTTPS URLs; SSH URLs never start with "http"
+        if not self.original_git_url.startswith(_HTTP):
             return self.original_git_url
 
         parsed = urlparse(self.original_git_url)
         host = parsed.netloc.lower()
 
         # Check if this is a public platform that needs OAuth2-style authentication
-        is_public_platform = any(domain in host for domain in [
-            'github.com', 'gitlab.com', 'gitea.com', 'bitbucket.org',
-            'git.github.com', 'gitlab.io'
-        ])
+        is_public_platform = any(domain in host for domain in _PUBLIC_GIT_HOSTS)
 
         # If using token for private Git server, embed in URL
         if self.git_token and not is_public_platform:
@@ -146,9 +240,8 @@ class GitService:
             True if URL uses SSH protocol
         """
         return (
-            self.original_git_url.startswith('git@') or
-            self.original_git_url.startswith('ssh://') or
-            (':' in self.original_git_url and not self.original_git_url.startswith('http'))
+            self.original_git_url.startswith(_SSH_PREFIXES) or
+            (':' in self.original_git_url and not self.original_git_url.startswith(_HTTP))
         )
 
     def _get_safe_url(self, url: str | None = None) -> str:
@@ -166,7 +259,9 @@ class GitService:
         if not url:
             return url
 
-        from urllib.parse import urlparse, urlunparse
+        # Fast path: nothing to hide without embedded credentials
+        if not _AUTH_PROBE.search(url):
+            return url
 
         try:
             parsed = urlparse(url)
@@ -302,8 +397,6 @@ class GitService:
         Returns:
             Environment variables with credential helper configured
         """
-        from urllib.parse import urlparse
-
         parsed = urlparse(self.git_url)
         credential_dir = Path(tempfile.gettempdir()) / "devops_git_credentials"
         credential_dir.mkdir(parents=True, exist_ok=True)
@@ -316,7 +409,7 @@ class GitService:
         # - For private Git servers: leave username empty or use provided username
         # Try to detect if it's a known public platform
         host = parsed.netloc.lower()
-        if any(domain in host for domain in ['github.com', 'gitlab.com', 'gitea.com', 'bitbucket.org']):
+        if any(domain in host for domain in _PUBLIC_GIT_HOSTS):
             # Public platform - use oauth2 username
             username = "oauth2"
         else:
@@ -359,8 +452,6 @@ fi
         Returns:
             Environment variables with credential helper configured
         """
-        from urllib.parse import urlparse
-
         parsed = urlparse(self.git_url)
         credential_dir = Path(tempfile.gettempdir()) / "devops_git_credentials"
         credential_dir.mkdir(parents=True, exist_ok=True)
@@ -446,6 +537,46 @@ fi
                 pass
             self._askpass_file = None
 
+    def _git(self, *args: str, env: dict | None = None) -> str:
+        """Run a git command inside the cloned repository.
+
+        Args:
+            *args: Git subcommand and arguments
+            env: Extra environment variables (e.g. from _setup_auth)
+
+        Returns:
+            Captured stdout
+
+        Raises:
+            GitCommandError: If the command fails
+        """
+        return _run_git(["git", "-C", str(self.repo_path), *args], env=env)
+
+    def _head_commit(self) -> tuple[str, str, str]:
+        """Read HEAD commit details with a single git process.
+
+        Returns:
+            Tuple of (commit_hash, author, message)
+        """
+        output = self._git("log", "-1", "--format=%H%x00%an%x00%B")
+        commit_hash, author, message = output.split("\0", 2)
+        return commit_hash, author, message.strip()
+
+    def get_cache_key(self, branch: str | None = None) -> str:
+        """Get a stable key identifying this repository and branch.
+
+        The key is derived from the original URL (without embedded
+        credentials), so it stays the same across runs and processes.
+
+        Args:
+            branch: Optional branch name
+
+        Returns:
+            16-character hex digest
+        """
+        key_source = f"{self.original_git_url}|{branch or ''}"
+        return hashlib.blake2b(key_source.encode(), digest_size=8).hexdigest()
+
     def clone(self, target_dir: Path | None = None, branch: str | None = None) -> Path:
         """Clone a Git repository.
 
@@ -468,7 +599,10 @@ fi
             # Create a temp directory in work dir
             work_path = Path(settings.work_dir)
             work_path.mkdir(parents=True, exist_ok=True)
-            target_dir = work_path / f"repo_{id(self)}"
+            # Stable cache key plus a unique suffix so concurrent
+            # deployments of the same repository never share a directory
+            self._cache_key = self.get_cache_key(branch)
+            target_dir = work_path / f"repo_{self._cache_key}_{uuid.uuid4().hex[:8]}"
 
         self._log_info(f"目标目录: {target_dir}")
 
@@ -481,47 +615,37 @@ fi
             # Setup authentication
             env = self._setup_auth()
 
-            # Clone repository
-            import git
-            git.cmd.Git.GIT_PYTHON_TRACE = 'full'  # Enable full tracing for debugging
-
             self._log_info("正在克隆仓库...")
 
             # Clone without --depth to get all remote branches
             # Use --single-branch only if a specific branch is requested
-            clone_args = ["--no-tags"]
+            clone_args = ["git", "clone", "--no-tags"]
             if branch:
                 clone_args.extend(["--single-branch", "--branch", branch])
+            clone_args.extend([self.git_url, str(target_dir)])
 
-            self.repo_path = Path(
-                Repo.clone_from(
-                    self.git_url,
-                    target_dir,
-                    env=env,
-                    multi_options=clone_args
-                ).working_dir
-            )
-            self.repo = Repo(self.repo_path)
+            _run_git(clone_args, env=env)
+            self.repo_path = Path(target_dir)
+            self._single_branch = bool(branch)
 
             self._log_info("仓库克隆成功")
 
             # Get current branch and commit info
             try:
-                current_branch = self.repo.active_branch.name
+                current_branch = self._git("rev-parse", "--abbrev-ref", "HEAD").strip()
                 self._log_info(f"当前分支: {current_branch}")
 
-                head_commit = self.repo.head.commit
-                commit_message = head_commit.message.strip()
+                commit_hash, _, commit_message = self._head_commit()
                 # Truncate long commit messages
                 if len(commit_message) > 100:
                     commit_message = commit_message[:97] + "..."
-                self._log_info(f"最新提交: {head_commit.hexsha[:7]} - {commit_message}")
+                self._log_info(f"最新提交: {commit_hash[:7]} - {commit_message}")
             except Exception as e:
                 self._log_warning(f"无法获取仓库信息: {e}")
 
             # Fetch all remote branches to ensure they're available for checkout
             try:
-                self.repo.git.fetch(env=env, all=True, tags=False)
+                self._git("fetch", "--all", "--no-tags", env=env)
                 self._log_info("已获取所有远程分支")
             except GitCommandError as e:
                 # If fetch all fails, the initial clone should still work
@@ -559,7 +683,7 @@ fi
         Raises:
             GitError: If checkout operation fails
         """
-        if not self.repo:
+        if not self.repo_path:
             raise GitError("Repository not initialized. Call clone() first.")
 
         self._log_info(f"切换到分支: {branch_name}")
@@ -572,19 +696,24 @@ fi
             # Using --all to fetch all remotes and branches
             self._log_info("拉取最新代码...")
             try:
-                self.repo.git.fetch(env=env, all=True, prune=True, tags=False)
+                self._git("fetch", "--all", "--prune", "--no-tags", env=env)
                 self._log_info("已获取所有远程分支")
             except GitCommandError as fetch_error:
                 # If fetch fails, try without --all
                 try:
-                    self.repo.git.fetch(env=env, origin=branch_name, tags=False)
+                    self._git("fetch", "--no-tags", "origin", branch_name, env=env)
                     self._log_info(f"已获取分支 {branch_name}")
                 except GitCommandError:
                     # If both fail, continue - the branch might already exist
                     self._log_warning(f"获取远程分支失败（尝试继续）: {fetch_error}")
 
             # List all available remote branches for debugging
-            remote_refs = [ref.name for ref in self.repo.references]
+            remote_refs = [
+                ref.removeprefix(_REFS_HEADS).removeprefix(_REFS_REMOTES)
+                for ref in self._git(
+                    "for-each-ref", "--format=%(refname)", _REFS_HEADS, _REFS_REMOTES
+                ).splitlines()
+            ]
             # Log all references for debugging
             self._log_info(f"所有引用: {remote_refs}")
 
@@ -611,26 +740,26 @@ fi
             # Create local branch tracking remote branch
             try:
                 # Check if local branch already exists
-                self.repo.heads[branch_name]
+                self._git("rev-parse", "--verify", "--quiet", f"{_REFS_HEADS}{branch_name}")
                 # Local branch exists, just checkout
-                self.repo.git.checkout(branch_name)
+                self._git("checkout", branch_name)
                 self._log_info(f"已切换到本地分支: {branch_name}")
-            except (IndexError, GitCommandError):
+            except GitCommandError:
                 # Local branch doesn't exist, create new tracking branch
                 # Use git checkout -b to create and track remote branch
-                self.repo.git.checkout(remote_branch, b=branch_name)
+                self._git("checkout", "-b", branch_name, remote_branch)
                 self._log_info(f"已创建本地分支 '{branch_name}' 并跟踪远程分支 '{remote_branch}'")
 
             # Pull latest changes
             try:
-                pull_result = self.repo.remotes.origin.pull(env=env)
+                old_commit = self._git("rev-parse", "HEAD").strip()
+                self._git("pull", "--no-tags", "origin", env=env)
                 # Check if there were any updates
-                if pull_result and pull_result[0].flags > 0:
-                    head_commit = self.repo.head.commit
-                    commit_message = head_commit.message.strip()
+                commit_hash, _, commit_message = self._head_commit()
+                if commit_hash != old_commit:
                     if len(commit_message) > 100:
                         commit_message = commit_message[:97] + "..."
-                    self._log_info(f"已更新到: {head_commit.hexsha[:7]} - {commit_message}")
+                    self._log_info(f"已更新到: {commit_hash[:7]} - {commit_message}")
                 else:
                     self._log_info("已是最新版本")
             except GitCommandError as pull_error:
@@ -646,7 +775,7 @@ fi
         Raises:
             GitError: If pull operation fails
         """
-        if not self.repo:
+        if not self.repo_path:
             raise GitError("Repository not initialized. Call clone() first.")
 
         self._log_info("拉取最新代码...")
@@ -656,19 +785,18 @@ fi
             env = self._setup_auth()
 
             # Get current commit before pull
-            old_commit = self.repo.head.commit.hexsha[:7]
+            old_commit = self._git("rev-parse", "HEAD").strip()
 
-            pull_result = self.repo.remotes.origin.pull(env=env)
+            # git pull is fetch + merge of the tracked branch in one process
+            self._git("pull", "--no-tags", "origin", env=env)
 
             # Get new commit after pull
-            new_commit = self.repo.head.commit.hexsha[:7]
+            new_commit, _, commit_message = self._head_commit()
 
             if old_commit != new_commit:
-                head_commit = self.repo.head.commit
-                commit_message = head_commit.message.strip()
                 if len(commit_message) > 100:
                     commit_message = commit_message[:97] + "..."
-                self._log_info(f"已更新到: {new_commit} - {commit_message}")
+                self._log_info(f"已更新到: {new_commit[:7]} - {commit_message}")
             else:
                 self._log_info("已是最新版本")
         except GitCommandError as e:
@@ -689,17 +817,17 @@ fi
         Raises:
             GitError: If failed to get repository info
         """
-        if not self.repo:
+        if not self.repo_path:
             raise GitError("Repository not initialized. Call clone() first.")
 
         try:
-            head_commit = self.repo.head.commit
-            branch = self.repo.active_branch.name
+            commit_hash, author, commit_message = self._head_commit()
+            branch = self._git("rev-parse", "--abbrev-ref", "HEAD").strip()
 
             return GitInfo(
-                commit_hash=head_commit.hexsha,
-                commit_message=head_commit.message.strip(),
-                author=str(head_commit.author),
+                commit_hash=commit_hash,
+                commit_message=commit_message,
+                author=author,
                 branch=branch,
             )
         except GitCommandError as e:
@@ -714,29 +842,33 @@ fi
         Raises:
             GitError: If failed to get branches
         """
-        if not self.repo:
+        if not self.repo_path:
             raise GitError("Repository not initialized. Call clone() first.")
 
         self._log_info("获取分支列表...")
 
         try:
-            # Setup authentication for remote operations
-            env = self._setup_auth()
-
-            # For shallow clones, use ls-remote to get all branch references from remote
-            # This works even when local refs are incomplete due to shallow clone
-            refs_output = self.repo.git.ls_remote('origin', heads=True, env=env)
+            if self._single_branch:
+                # A --single-branch clone only tracks the requested branch,
+                # so list the heads on the remote instead
+                ls_remote_output = self._git("ls-remote", "--heads", "origin", env=self._setup_auth())
+                refs = [line.partition("\t")[2] for line in ls_remote_output.splitlines()]
+                prefix = _REFS_HEADS
+            else:
+                # A full clone fetched every remote branch, so the
+                # remote-tracking refs are complete without a network round trip
+                refs = self._git(
+                    "for-each-ref", "--format=%(refname)", _REFS_REMOTES_ORIGIN
+                ).splitlines()
+                prefix = _REFS_REMOTES_ORIGIN
 
             branches = []
-            for line in refs_output.split('\n'):
-                if not line.strip():
+            for ref in refs:
+                if not ref.startswith(prefix):
                     continue
-                # ls-remote output format: <commit-hash>\trefs/heads/<branch-name>
-                parts = line.split('\t')
-                if len(parts) == 2 and parts[1].startswith('refs/heads/'):
-                    branch_name = parts[1].replace('refs/heads/', '')
-                    if branch_name:  # Skip empty branch names
-                        branches.append(branch_name)
+                branch_name = ref[len(prefix):]
+                if branch_name and branch_name != 'HEAD':  # Skip empty names and origin/HEAD
+                    branches.append(branch_name)
 
             # Sort branches
             return sorted(branches)
@@ -752,9 +884,19 @@ fi
     def cleanup(self) -> None:
         """Clean up the cloned repository and credentials."""
         if self.repo_path and self.repo_path.exists():
-            shutil.rmtree(self.repo_path, ignore_errors=True)
+            _fast_rmtree(self.repo_path)
+            self.repo_path = None
+
+        # Clean up credential file
+        self._cleanup_credential_file()
+        # Clean up SSH key file
+        self._cleanup_ssh_key()
+
+    async def cleanup_async(self) -> None:
+        """Clean up the cloned repository without blocking the event loop."""
+        if self.repo_path and self.repo_path.exists():
+            await asyncio.to_thread(_fast_rmtree, self.repo_path)
             self.repo_path = None
-            self.repo = None
 
         # Clean up credential file
         self._cleanup_credential_file()
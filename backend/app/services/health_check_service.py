@@ -1,15 +1,17 @@
 """Health check service for verifying deployment health."""
 import asyncio
 import socket
+import urllib.request
 from typing import Callable
+from urllib.parse import urlsplit
 
 import httpx
 
 from app.config import settings
-from app.core.ssh import SSHConnection, SSHLogger, create_ssh_connection
+from app.core.ssh import SSHConnection, create_ssh_connection
 from app.models.project import HealthCheckType, Project
 from app.models.server import Server
-from app.services.log_service import DeploymentLogger
+from app.services.log_service import CommandOutputLogger, DeploymentLogger
 
 
 class HealthCheckError(Exception):
@@ -18,26 +20,6 @@ class HealthCheckError(Exception):
     pass
 
 
-class _HealthCheckSSHLoggerAdapter(SSHLogger):
-    """Adapter to connect DeploymentLogger with SSHLogger interface."""
-
-    def __init__(self, deployment_logger: DeploymentLogger):
-        """Initialize adapter.
-
-        Args:
-            deployment_logger: Deployment logger instance
-        """
-        self._logger = deployment_logger
-
-    async def info(self, message: str) -> None:
-        """Log info message."""
-        await self._logger.info(message)
-
-    async def error(self, message: str) -> None:
-        """Log error message."""
-        await self._logger.error(message)
-
-
 class HealthCheckService:
     """Service for performing health checks on deployed applications."""
 
@@ -122,6 +104,10 @@ class HealthCheckService:
             if settings.deployment_log_verbosity == "detailed":
                 await self.logger.info(f"替换为服务器地址: {url}")
 
+        # Target of the cheap TCP pre-probe (None: always send the request)
+        probe_target = self._probe_target(url)
+        probe_timeout = min(1.0, timeout)
+
         if settings.deployment_log_verbosity == "detailed":
             await self.logger.info(
                 f"HTTP 健康检查: {url} (超时: {timeout}s, 重试: {retries}次, 间隔: {interval}s)"
@@ -136,18 +122,23 @@ class HealthCheckService:
                     if settings.deployment_log_verbosity == "detailed":
                         await self.logger.info(f"HTTP 健康检查尝试 {attempt}/{retries}")
 
-                    response = await client.get(url)
-                    status_code = response.status_code
-
-                    if 200 <= status_code < 400:
-                        # minimal 模式下只记录最终成功一次
-                        await self.logger.info("健康检查通过")
-                        return True
+                    # Skip the HTTP request while the application is still binding
+                    if probe_target is None or await self._is_port_open(*probe_target, probe_timeout):
+                        response = await client.get(url)
+                        status_code = response.status_code
+
+                        if 200 <= status_code < 400:
+                            # minimal 模式下只记录最终成功一次
+                            await self.logger.info("健康检查通过")
+                            return True
+                        else:
+                            if settings.deployment_log_verbosity == "detailed":
+                                await self.logger.warning(
+                                    f"HTTP 健康检查失败 (状态码: {status_code})"
+                                )
                     else:
                         if settings.deployment_log_verbosity == "detailed":
-                            await self.logger.warning(
-                                f"HTTP 健康检查失败 (状态码: {status_code})"
-                            )
+                            await self.logger.warning(f"HTTP 端口 {probe_target[1]} 未监听，跳过本次请求")
 
                 except httpx.TimeoutException:
                     if settings.deployment_log_verbosity == "detailed":
@@ -168,6 +159,55 @@ class HealthCheckService:
         await self.logger.error("健康检查失败")
         return False
 
+    def _probe_target(self, url: str) -> tuple[str, int] | None:
+        """Resolve the address for the TCP pre-probe of an HTTP check.
+
+        The probe is skipped when httpx would send the request through an
+        environment proxy (trust_env), since a direct connection says
+        nothing about reachability then, and when the URL's port is
+        malformed, which the request itself reports on every attempt.
+
+        Args:
+            url: Health check URL
+
+        Returns:
+            (host, port) to probe, or None if the probe must be skipped
+        """
+        try:
+            parsed = urlsplit(url)
+            port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        except ValueError:
+            return None
+
+        host = parsed.hostname or self.server.host
+        proxies = urllib.request.getproxies()
+        if (proxies.get(parsed.scheme) or proxies.get("all")) and not urllib.request.proxy_bypass(host):
+            return None
+        return host, port
+
+    async def _is_port_open(self, host: str, port: int, timeout: float) -> bool:
+        """Check whether a TCP port accepts connections.
+
+        Args:
+            host: Target host
+            port: Target port
+            timeout: Connection timeout in seconds
+
+        Returns:
+            True if the connection succeeds, False otherwise
+        """
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
     async def _check_tcp(self) -> bool:
         """Perform TCP port health check with retry mechanism.
 
@@ -265,21 +305,23 @@ class HealthCheckService:
 
                 # minimal 模式下不 streaming 输出
                 if settings.deployment_log_verbosity == "minimal":
-                    exit_code, stdout, stderr = self.ssh_connection.execute_command(full_command)
+                    exit_code, stdout, stderr = await asyncio.to_thread(
+                        self.ssh_connection.execute_command, full_command
+                    )
                     if exit_code == 0:
                         await self.logger.info("健康检查通过")
                         return True
                 else:
-                    # Execute command with streaming output
-                    exit_code, stdout, stderr = self.ssh_connection.execute_command_streaming(
-                        full_command,
-                        on_stdout=lambda line: asyncio.create_task(
-                            self.logger.info(f"[stdout] {line}")
-                        ),
-                        on_stderr=lambda line: asyncio.create_task(
-                            self.logger.info(f"[stderr] {line}")
-                        ),
-                    )
+                    # Execute command with streaming output. The blocking SSH
+                    # call runs in a worker thread so the output queue drains
+                    # (and is logged live) while the command is still running
+                    async with CommandOutputLogger(self.logger) as output:
+                        exit_code, stdout, stderr = await asyncio.to_thread(
+                            self.ssh_connection.execute_command_streaming,
+                            full_command,
+                            on_stdout=output.stdout,
+                            on_stderr=output.stderr,
+                        )
 
                     await self.logger.info(f"命令退出码: {exit_code}")
 
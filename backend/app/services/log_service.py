@@ -1,11 +1,15 @@
 """Log service for deployment logs."""
 import asyncio
+import threading
 from collections import deque
+from contextlib import aclosing
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from enum import Enum
+from itertools import islice
 from typing import AsyncGenerator
 
+from sqlalchemy import Row, insert, select
 from sqlalchemy.orm import Session
 
 from app.models.deployment import Deployment, DeploymentLog
@@ -20,17 +24,33 @@ class LogLevel(str, Enum):
     ERROR = "ERROR"
 
 
-@dataclass
+@dataclass(slots=True)
 class LogEntry:
     """Log entry."""
 
     level: LogLevel
     content: str
     timestamp: datetime
+    seq: int = 0
+    # ISO timestamp and SSE frame, formatted once in LogBuffer.append and
+    # shared by all readers
+    ts_iso: str = field(init=False, default="")
+    sse: bytes = field(init=False, default=b"")
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    """Resolve a wake-up future if nobody else did."""
+    if not waiter.done():
+        waiter.set_result(None)
 
 
 class LogBuffer:
-    """In-memory log buffer for real-time streaming."""
+    """In-memory log buffer for real-time streaming.
+
+    Entries live in a single ring shared by all readers; each reader tracks
+    the sequence number it has seen, so appending is O(1) regardless of the
+    number of subscribers.
+    """
 
     def __init__(self, max_size: int = 1000) -> None:
         """Initialize log buffer.
@@ -39,79 +59,118 @@ class LogBuffer:
             max_size: Maximum number of log entries to keep in memory
         """
         self.buffer: deque[LogEntry] = deque(maxlen=max_size)
-        self._subscribers: set[asyncio.Queue] = set()
-        self._lock = asyncio.Lock()
+        self._seq = 0
+        # One wake-up future per event loop with waiting readers; deployments
+        # log from a worker-thread loop while SSE readers run on the server loop
+        self._waiters: dict[asyncio.AbstractEventLoop, asyncio.Future] = {}
+        # Guards buffer, _seq and _waiters across those threads
+        self._lock = threading.Lock()
         self._closed = False  # Track if buffer is closed
 
-    async def subscribe(self) -> asyncio.Queue:
-        """Subscribe to log updates.
-
-        Returns:
-            Queue for receiving log updates
-        """
-        if self._closed:
-            # Return a closed queue if buffer is closed
-            queue: asyncio.Queue[LogEntry] = asyncio.Queue()
-            await queue.put(None)  # Signal closed
-            return queue
+    async def aiter(
+        self,
+        from_seq: int = 0,
+        keepalive: float | None = None,
+    ) -> AsyncGenerator[LogEntry | None, None]:
+        """Iterate over buffered and future log entries until the buffer closes.
 
-        queue: asyncio.Queue[LogEntry] = asyncio.Queue()
-        async with self._lock:
-            self._subscribers.add(queue)
+        Args:
+            from_seq: Only yield entries with a sequence number above this
+            keepalive: Seconds to wait for new entries before yielding None
 
-            # Send existing logs to new subscriber
-            for entry in self.buffer:
-                await queue.put(entry)
+        Yields:
+            Log entries in order, or None when keepalive elapses
+        """
+        loop = asyncio.get_running_loop()
+        last_seq = from_seq
+        while True:
+            waiter = None
+            with self._lock:
+                # Sequence numbers are contiguous, so the unseen entries are
+                # exactly the newest ``unseen`` ones in the ring
+                unseen = min(self._seq - last_seq, len(self.buffer))
+                if unseen > 0:
+                    new_entries = list(islice(reversed(self.buffer), unseen))
+                elif self._closed:
+                    return
+                else:
+                    # Registered under the lock, so no append can slip in between
+                    waiter = self._waiters.get(loop)
+                    if waiter is None or waiter.done():
+                        waiter = loop.create_future()
+                        self._waiters[loop] = waiter
+
+            if waiter is None:
+                last_seq = new_entries[0].seq
+                for entry in reversed(new_entries):
+                    yield entry
+                continue
 
-        return queue
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), keepalive)
+            except asyncio.TimeoutError:
+                yield None
 
     async def close(self) -> None:
         """Close the buffer and notify all subscribers."""
-        async with self._lock:
+        with self._lock:
             self._closed = True
-            # Send close signal to all subscribers
-            for queue in list(self._subscribers):
-                try:
-                    await queue.put(None)
-                except Exception:
-                    pass
-            self._subscribers.clear()
-
-    async def unsubscribe(self, queue: asyncio.Queue) -> None:
-        """Unsubscribe from log updates.
-
-        Args:
-            queue: Queue to unsubscribe
-        """
-        async with self._lock:
-            self._subscribers.discard(queue)
-
-    async def append(self, level: LogLevel, content: str) -> None:
+            waiters, self._waiters = self._waiters, {}
+        _notify_all(waiters)
+
+    async def append(
+        self,
+        level: LogLevel,
+        content: str,
+        timestamp: datetime | None = None,
+    ) -> None:
         """Append a log entry.
 
         Args:
             level: Log level
             content: Log content
+            timestamp: Log time (defaults to now, UTC)
         """
         if self._closed:
             return
 
-        entry = LogEntry(
-            level=level,
-            content=content,
-            timestamp=datetime.now(timezone.utc),
-        )
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc)
+        entry = LogEntry(level=level, content=content, timestamp=timestamp)
+        entry.ts_iso = timestamp.isoformat()
+        entry.sse = f"data: {level.value} {entry.ts_iso} {content}\n\n".encode()
 
-        self.buffer.append(entry)
+        with self._lock:
+            self._seq += 1
+            entry.seq = self._seq
+            self.buffer.append(entry)
+            waiters, self._waiters = self._waiters, {}
+        _notify_all(waiters)
 
-        # Notify subscribers
-        async with self._lock:
-            for queue in list(self._subscribers):
-                try:
-                    await queue.put(entry)
-                except Exception:
-                    # Subscriber queue is full or closed, remove it
-                    self._subscribers.discard(queue)
+
+def _notify_all(waiters: dict[asyncio.AbstractEventLoop, asyncio.Future]) -> None:
+    """Wake every waiting reader, whichever event loop it runs on.
+
+    Args:
+        waiters: Wake-up futures taken from a LogBuffer, keyed by loop
+    """
+    if not waiters:
+        return
+
+    try:
+        current_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        current_loop = None
+
+    for loop, waiter in waiters.items():
+        if loop is current_loop:
+            _wake(waiter)
+        else:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # Reader's loop already closed
+                pass
 
 
 # Global registry of deployment log buffers
@@ -119,17 +178,27 @@ _log_buffers: dict[int, LogBuffer] = {}
 _buffers_lock = asyncio.Lock()
 
 
-@dataclass
-class PendingLogEntry:
-    """Pending log entry for batch writing."""
+# Queued log line: (level, content, created_at). Plain tuples keep the
+# per-log allocation to one small object (CPython reuses tuple storage)
+_PendingLog = tuple[str, str, datetime]
 
-    level: str
-    content: str
-    timestamp: datetime
+# Compiled once and reused for every batch; rows are plain column mappings
+# so flushing never constructs ORM instances
+_INSERT_DEPLOYMENT_LOG = insert(DeploymentLog)
+
+# SQLite fast path: one DBAPI executemany without per-row SQLAlchemy processing
+_SQLITE_INSERT_DEPLOYMENT_LOG = (
+    f"INSERT INTO {DeploymentLog.__tablename__} "
+    "(deployment_id, level, content, created_at) VALUES (?, ?, ?, ?)"
+)
 
 
 class BatchLogWriter:
-    """Batch log writer to reduce database commit frequency."""
+    """Batch log writer to reduce database commit frequency.
+
+    Producers only push onto a bounded queue; a background task per
+    deployment drains it and writes each batch with a single commit.
+    """
 
     def __init__(self, deployment_id: int, db: Session, batch_size: int = 50, flush_interval: float = 1.0):
         """Initialize batch log writer.
@@ -144,9 +213,11 @@ class BatchLogWriter:
         self.db = db
         self.batch_size = batch_size
         self.flush_interval = flush_interval
-        self.pending_logs: list[PendingLogEntry] = []
-        self._last_flush = datetime.now(timezone.utc)
+        self._queue: asyncio.Queue[_PendingLog | None] = asyncio.Queue(maxsize=batch_size * 4)
+        self._batch_full = asyncio.Event()
+        self._writer_task: asyncio.Task | None = None
         self._lock = asyncio.Lock()
+        self._closed = False
 
     async def add_log(self, level: str, content: str, timestamp: datetime) -> None:
         """Add a log entry to the batch.
@@ -156,47 +227,131 @@ class BatchLogWriter:
             content: Log content
             timestamp: Log timestamp
         """
-        async with self._lock:
-            self.pending_logs.append(PendingLogEntry(level=level, content=content, timestamp=timestamp))
+        entry = (level, content, timestamp)
 
-            # Auto-flush if batch size reached
-            if len(self.pending_logs) >= self.batch_size:
-                await self._flush()
+        if self._closed:
+            # Writer already stopped, persist directly
+            async with self._lock:
+                self._write([entry])
+            return
+
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._drain_loop())
+
+        await self._queue.put(entry)
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_full.set()
 
     async def flush(self) -> None:
         """Manually flush pending logs to database."""
         async with self._lock:
-            await self._flush()
+            batch = []
+            while not self._queue.empty():
+                entry = self._queue.get_nowait()
+                if entry is not None:
+                    batch.append(entry)
+            self._write(batch)
 
-    async def _flush(self) -> None:
-        """Internal flush implementation."""
-        if not self.pending_logs:
+    async def close(self) -> None:
+        """Stop the background writer and flush remaining logs."""
+        if self._closed:
             return
+        self._closed = True
 
-        # Batch insert all pending logs
-        for entry in self.pending_logs:
-            log_entry = DeploymentLog(
-                deployment_id=self.deployment_id,
-                level=entry.level,
-                content=entry.content,
-                created_at=entry.timestamp,
-            )
-            self.db.add(log_entry)
+        if self._writer_task is not None:
+            # Sentinel tells the drain loop to exit after its current batch
+            await self._queue.put(None)
+            self._batch_full.set()
+            await self._writer_task
+            self._writer_task = None
+
+        await self.flush()
+
+    async def _drain_loop(self) -> None:
+        """Background task that writes queued logs in batches.
+
+        Exits once the queue is drained; add_log restarts it on demand.
+        """
+        while not self._queue.empty():
+            # Give producers up to flush_interval to fill the batch. Entries
+            # stay queued while waiting, so a concurrent flush() writes them
+            # and rows keep their arrival order
+            if self._queue.qsize() < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_full.clear()
+
+            stop = False
+            async with self._lock:
+                batch = []
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    next_entry = self._queue.get_nowait()
+                    if next_entry is None:
+                        stop = True
+                        break
+                    batch.append(next_entry)
+                self._write(batch)
+
+            if stop:
+                return
+
+    def _write(self, batch: list[_PendingLog]) -> None:
+        """Write a batch of logs with a single INSERT and commit.
+
+        Args:
+            batch: Queued log lines to persist
+        """
+        if not batch:
+            return
+
+        dialect = self.db.get_bind().dialect
+        if dialect.name == "sqlite":
+            self._write_sqlite(batch, dialect)
+        else:
+            # Single executemany INSERT (insertmanyvalues) for all pending logs
+            rows = [
+                {
+                    "deployment_id": self.deployment_id,
+                    "level": level,
+                    "content": content,
+                    "created_at": created_at,
+                }
+                for level, content, created_at in batch
+            ]
+            self.db.execute(_INSERT_DEPLOYMENT_LOG, rows)
 
         # Single commit for all logs
         self.db.commit()
-        self.pending_logs.clear()
-        self._last_flush = datetime.now(timezone.utc)
 
-    async def should_flush(self) -> bool:
-        """Check if logs should be flushed based on time interval.
+    def _write_sqlite(self, batch: list[_PendingLog], dialect) -> None:
+        """Insert a batch through the raw DBAPI cursor on SQLite.
 
-        Returns:
-            True if flush interval has elapsed
+        Args:
+            batch: Queued log lines to persist
+            dialect: Active SQLite dialect
         """
-        async with self._lock:
-            elapsed = (datetime.now(timezone.utc) - self._last_flush).total_seconds()
-            return elapsed >= self.flush_interval and len(self.pending_logs) > 0
+        # Store created_at exactly as the ORM would so reads stay compatible
+        created_at_type = DeploymentLog.__table__.c.created_at.type
+        to_db = created_at_type.dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+
+        deployment_id = self.deployment_id
+        rows = [
+            (deployment_id, level, content, to_db(created_at))
+            for level, content, created_at in batch
+        ]
+
+        # Run inside the session's transaction so commit() covers it
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.executemany(_SQLITE_INSERT_DEPLOYMENT_LOG, rows)
+        finally:
+            cursor.close()
+
+
+# Global registry of active batch writers, closed in remove_log_buffer
+_batch_writers: dict[int, BatchLogWriter] = {}
 
 
 def get_log_buffer(deployment_id: int) -> LogBuffer:
@@ -208,9 +363,11 @@ def get_log_buffer(deployment_id: int) -> LogBuffer:
     Returns:
         Log buffer instance
     """
-    if deployment_id not in _log_buffers:
-        _log_buffers[deployment_id] = LogBuffer()
-    return _log_buffers[deployment_id]
+    buffer = _log_buffers.get(deployment_id)
+    if buffer is None:
+        # setdefault is atomic, so concurrent callers always share one buffer
+        buffer = _log_buffers.setdefault(deployment_id, LogBuffer())
+    return buffer
 
 
 async def remove_log_buffer(deployment_id: int) -> None:
@@ -219,6 +376,10 @@ async def remove_log_buffer(deployment_id: int) -> None:
     Args:
         deployment_id: Deployment ID
     """
+    writer = _batch_writers.pop(deployment_id, None)
+    if writer is not None:
+        await writer.close()
+
     async with _buffers_lock:
         if deployment_id in _log_buffers:
             # Close the buffer to notify all subscribers
@@ -237,16 +398,17 @@ class DeploymentLogger:
         Args:
             deployment_id: Deployment ID
             db: Database session
-            enable_batch: Enable batch writing (default: True)
+            enable_batch: Enable batch writing (default: True). When disabled,
+                every log is committed immediately.
         """
         self.deployment_id = deployment_id
         self.db = db
         self.buffer = get_log_buffer(deployment_id)
         self.enable_batch = enable_batch
 
-        # Initialize batch writer if enabled
-        if enable_batch:
-            self.batch_writer = BatchLogWriter(deployment_id, db)
+        # The batch writer is the only persistence path
+        self.batch_writer = BatchLogWriter(deployment_id, db)
+        _batch_writers[deployment_id] = self.batch_writer
 
     async def debug(self, message: str) -> None:
         """Log debug message.
@@ -291,87 +453,183 @@ class DeploymentLogger:
         utc_now = datetime.now(timezone.utc)
 
         # Add to in-memory buffer for SSE streaming (immediate)
-        await self.buffer.append(level, message)
+        await self.buffer.append(level, message, utc_now)
 
-        # Persist to database (batched or immediate)
-        if self.enable_batch:
-            # Batch writing for better performance
-            await self.batch_writer.add_log(level.value, message, utc_now)
-        else:
-            # Immediate write for compatibility
-            log_entry = DeploymentLog(
-                deployment_id=self.deployment_id,
-                level=level.value,
-                content=message,
-                created_at=utc_now,
-            )
-            self.db.add(log_entry)
-            self.db.commit()
+        # Persist to database (group commit via the batch writer)
+        await self.batch_writer.add_log(level.value, message, utc_now)
+        if not self.enable_batch:
+            await self.batch_writer.flush()
 
     async def flush(self) -> None:
         """Flush any pending batched logs to database."""
-        if self.enable_batch:
-            await self.batch_writer.flush()
+        await self.batch_writer.flush()
+
+    async def close(self) -> None:
+        """Stop the background writer and persist remaining logs."""
+        await self.batch_writer.close()
+        if _batch_writers.get(self.deployment_id) is self.batch_writer:
+            del _batch_writers[self.deployment_id]
+
+
+class CommandOutputLogger:
+    """Log streamed command output through one writer task.
+
+    SSH streaming callbacks call ``stdout``/``stderr`` synchronously for
+    every line. Lines are queued and a single task drains them in order,
+    instead of creating one task per line. When the queue is full the
+    oldest line is dropped so a noisy command cannot block the caller.
+    The callbacks may run in a worker thread (``asyncio.to_thread``); such
+    lines are handed to the event loop thread before being queued.
+
+    Use as an async context manager; leaving it waits for queued lines.
+    """
+
+    def __init__(
+        self,
+        logger: DeploymentLogger,
+        maxsize: int = 4096,
+        batch_size: int = 128,
+    ) -> None:
+        """Initialize command output logger.
+
+        Args:
+            logger: Logger that receives the output lines
+            maxsize: Maximum number of queued lines
+            batch_size: Maximum lines taken from the queue per wake-up
+        """
+        self.logger = logger
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=maxsize)
+        self._writer_task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+
+    async def __aenter__(self) -> "CommandOutputLogger":
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._writer_task = asyncio.create_task(self._drain())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:  # type: ignore
+        # Wait for queue space only while the drain task is alive; if it
+        # died the queue would stay full forever
+        sentinel = asyncio.ensure_future(self._queue.put(None))
+        try:
+            await asyncio.wait(
+                {sentinel, self._writer_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            sentinel.cancel()
+        try:
+            await self._writer_task
+        finally:
+            self._writer_task = None
+        if self.dropped:
+            await self.logger.warning(f"输出过多，已丢弃 {self.dropped} 行")
+
+    def stdout(self, line: str) -> None:
+        """Queue a stdout line (SSH streaming callback).
+
+        Args:
+            line: Output line
+        """
+        self._put(f"[stdout] {line}")
+
+    def stderr(self, line: str) -> None:
+        """Queue a stderr line (SSH streaming callback).
+
+        Args:
+            line: Output line
+        """
+        self._put(f"[stderr] {line}")
+
+    def _put(self, message: str) -> None:
+        """Queue a message from any thread."""
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._put_nowait, message)
+        else:
+            self._put_nowait(message)
+
+    def _put_nowait(self, message: str) -> None:
+        """Queue a message, dropping the oldest one when full."""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def _drain(self) -> None:
+        """Write queued lines until the close sentinel arrives."""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            for message in batch:
+                if message is None:
+                    return
+                await self.logger.info(message)
+
+
+_SSE_KEEPALIVE = b": keepalive\n\n"
 
 
 async def stream_deployment_logs(
     deployment_id: int,
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """Stream deployment logs via Server-Sent Events.
 
     Args:
         deployment_id: Deployment ID
 
     Yields:
-        SSE-formatted log messages
+        SSE-formatted log messages, already encoded
     """
     buffer = get_log_buffer(deployment_id)
-    queue = await buffer.subscribe()
 
-    try:
-        # Send initial marker to indicate connection established
-        yield f"data: [SYSTEM] Stream connected for deployment {deployment_id}\n\n"
+    # Send initial marker to indicate connection established
+    yield f"data: [SYSTEM] Stream connected for deployment {deployment_id}\n\n".encode()
 
-        while True:
-            # Send keepalive every 30 seconds
-            try:
-                entry = await asyncio.wait_for(queue.get(), timeout=30.0)
+    # Send keepalive every 30 seconds
+    async with aclosing(buffer.aiter(keepalive=30.0)) as entries:
+        async for entry in entries:
+            if entry is None:
+                yield _SSE_KEEPALIVE
+                continue
 
-                # Check for close signal (None)
-                if entry is None:
-                    # Buffer closed, send end signal and exit
-                    yield f"data: [SYSTEM] Stream closed for deployment {deployment_id}\n\n"
-                    break
+            yield entry.sse
 
-                yield f"data: {entry.level.value} {entry.timestamp.isoformat()} {entry.content}\n\n"
-            except asyncio.TimeoutError:
-                yield ": keepalive\n\n"
-    except GeneratorExit:
-        # Client disconnected
-        pass
-    finally:
-        await buffer.unsubscribe(queue)
+    # Buffer closed, send end signal
+    yield f"data: [SYSTEM] Stream closed for deployment {deployment_id}\n\n".encode()
 
 
 def get_deployment_logs_from_db(
     db: Session,
     deployment_id: int,
     limit: int = 1000,
-) -> list[DeploymentLog]:
+) -> list[Row]:
     """Get deployment logs from database.
 
+    Returns lightweight Core rows instead of ORM instances, since callers
+    only render the logs.
+
     Args:
         db: Database session
         deployment_id: Deployment ID
         limit: Maximum number of logs to return
 
     Returns:
-        List of deployment logs
+        List of rows with id, created_at, level and content
     """
-    return (
-        db.query(DeploymentLog)
-        .filter(DeploymentLog.deployment_id == deployment_id)
-        .order_by(DeploymentLog.timestamp)
+    stmt = (
+        select(
+            DeploymentLog.id,
+            DeploymentLog.created_at,
+            DeploymentLog.level,
+            DeploymentLog.content,
+        )
+        .where(DeploymentLog.deployment_id == deployment_id)
+        .order_by(DeploymentLog.created_at, DeploymentLog.id)
         .limit(limit)
-        .all()
     )
+    return list(db.execute(stmt).all())
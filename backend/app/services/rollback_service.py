@@ -1,13 +1,17 @@
 """Rollback service for reverting deployments."""
+import asyncio
+import mmap
+import os
 from pathlib import Path
 from typing import Callable
 
 from sqlalchemy.orm import Session
 
-from app.core.ssh import SSHLogger, create_ssh_connection
+from app.core.ssh import ssh_pool
 from app.models.deployment import Deployment, DeploymentStatus, DeploymentStatus
 from app.models.server import Server
 from app.services.log_service import DeploymentLogger
+from app.services.server_rollout import run_on_server_groups
 
 
 class RollbackError(Exception):
@@ -16,26 +20,6 @@ class RollbackError(Exception):
     pass
 
 
-class _RollbackSSHLoggerAdapter(SSHLogger):
-    """Adapter to connect DeploymentLogger with SSHLogger interface."""
-
-    def __init__(self, deployment_logger: DeploymentLogger):
-        """Initialize adapter.
-
-        Args:
-            deployment_logger: Deployment logger instance
-        """
-        self._logger = deployment_logger
-
-    async def info(self, message: str) -> None:
-        """Log info message."""
-        await self._logger.info(message)
-
-    async def error(self, message: str) -> None:
-        """Log error message."""
-        await self._logger.error(message)
-
-
 class RollbackService:
     """Service for rolling back deployments."""
 
@@ -99,6 +83,9 @@ class RollbackService:
             self.db.commit()
             await self.logger.error(f"Rollback failed: {e}")
             raise RollbackError(f"Rollback failed: {e}") from e
+        finally:
+            # Stop the background log writer and persist pending logs
+            await self.logger.close()
 
     async def _deploy_to_servers(self, artifact_path: Path) -> None:
         """Deploy artifact to all servers in server groups.
@@ -110,35 +97,46 @@ class RollbackService:
 
         await self.logger.info(f"Deploying to {len(server_groups)} server group(s)")
 
-        for group in server_groups:
-            await self.logger.info(f"Deploying to server group: {group.name}")
-
-            for server in group.servers:
-                if not server.is_active:
-                    await self.logger.warning(f"Skipping inactive server: {server.name}")
-                    continue
+        # Read the artifact from disk once and share it with every upload.
+        # mmap rejects empty files, so an empty artifact is uploaded as b""
+        artifact_data: mmap.mmap | bytes = b""
+        with open(artifact_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                artifact_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
-                await self._deploy_to_server(server, artifact_path)
+        try:
+            # Servers are independent, so roll them back concurrently
+            await run_on_server_groups(
+                server_groups,
+                lambda server: self._deploy_to_server(server, artifact_path, artifact_data),
+                self.logger,
+            )
+        finally:
+            if isinstance(artifact_data, mmap.mmap):
+                artifact_data.close()
 
-    async def _deploy_to_server(self, server: Server, artifact_path: Path) -> None:
+    async def _deploy_to_server(
+        self, server: Server, artifact_path: Path, artifact_data: mmap.mmap | bytes
+    ) -> None:
         """Deploy artifact to a single server.
 
         Args:
             server: Server to deploy to
             artifact_path: Path to deployment artifact
+            artifact_data: Read-only mapping of the artifact contents
+                (b"" for an empty artifact)
         """
         await self.logger.info(f"Deploying to server: {server.name} ({server.host})")
 
         try:
-            # Create SSH logger adapter
-            ssh_logger = _RollbackSSHLoggerAdapter(self.logger)
-            conn = create_ssh_connection(server, logger=ssh_logger)
-
-            with conn:
+            # Reuse a warm connection when this server was used recently.
+            # Paramiko calls block, so run them in worker threads to let
+            # servers in the same group overlap
+            async with ssh_pool.acquire(server, logger=self.logger) as conn:
                 # Upload artifact
                 await self.logger.info(f"Uploading artifact to {server.host}")
                 remote_temp = f"/tmp/{artifact_path.name}"
-                conn.upload_file(artifact_path, remote_temp)
+                await asyncio.to_thread(conn.upload_bytes, artifact_data, remote_temp)
 
                 # Extract to project's upload path
                 project = self.source_deployment.project
@@ -147,10 +145,11 @@ class RollbackService:
                     raise RollbackError("项目未配置 upload_path，无法回滚")
 
                 await self.logger.info(f"Extracting to {upload_path}")
-                exit_code, stdout, stderr = conn.execute_command(
+                exit_code, stdout, stderr = await asyncio.to_thread(
+                    conn.execute_command,
                     f"mkdir -p {upload_path} && "
                     f"tar -xzf {remote_temp} -C {upload_path} && "
-                    f"rm {remote_temp}"
+                    f"rm {remote_temp}",
                 )
 
                 if exit_code != 0:
@@ -171,7 +170,7 @@ class RollbackService:
                     await self.logger.info(
                         f"Executing restart script"
                     )
-                    exit_code, stdout, stderr = conn.execute_command(command)
+                    exit_code, stdout, stderr = await asyncio.to_thread(conn.execute_command, command)
 
                     if exit_code != 0:
                         await self.logger.warning(f"Restart script failed: {stderr}")
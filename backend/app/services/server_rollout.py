@@ -0,0 +1,58 @@
+"""Run per-server deployment steps across server groups."""
+import asyncio
+from typing import Awaitable, Callable, Iterable
+
+from app.config import settings
+from app.models.server import Server, ServerGroup
+from app.services.log_service import DeploymentLogger
+
+
+async def run_on_server_groups(
+    server_groups: Iterable[ServerGroup],
+    deploy_server: Callable[[Server], Awaitable[None]],
+    logger: DeploymentLogger,
+) -> None:
+    """Run ``deploy_server`` on every active server, one group at a time.
+
+    Servers within a group are independent and run concurrently, bounded by
+    ``settings.max_parallel_servers``. A failing server does not cancel the
+    rest of its group: once the whole group has finished, every error is
+    logged and the first one is raised, so later groups are not started.
+
+    Args:
+        server_groups: Server groups in rollout order
+        deploy_server: Coroutine function handling a single server
+        logger: Deployment logger
+
+    Raises:
+        BaseException: The first error raised by ``deploy_server`` in the
+            failing group
+    """
+    # Bound concurrent SSH sessions per group
+    server_slots = asyncio.Semaphore(settings.max_parallel_servers)
+
+    async def deploy_with_slot(server: Server) -> None:
+        async with server_slots:
+            await deploy_server(server)
+
+    for group in server_groups:
+        await logger.info(f"Deploying to server group: {group.name}")
+
+        active_servers = []
+        for server in group.servers:
+            if not server.is_active:
+                await logger.warning(f"Skipping inactive server: {server.name}")
+                continue
+            active_servers.append(server)
+
+        # 同组服务器互不依赖，并发部署；全部结束后再报告失败
+        results = await asyncio.gather(
+            *(deploy_with_slot(server) for server in active_servers),
+            return_exceptions=True,
+        )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for error in errors:
+            await logger.error(str(error))
+        if errors:
+            raise errors[0]
@@ -1,41 +1,55 @@
 """Script execution utilities."""
-from pathlib import Path
-from typing import Dict
+import os
+import shlex
+from functools import lru_cache
+from typing import NamedTuple
 
 
-def get_script_execution_info(script_path: str) -> Dict[str, str]:
+class ScriptInfo(NamedTuple):
+    """脚本执行信息."""
+
+    working_dir: str
+    command: str
+    script_name: str
+
+
+def get_script_execution_info(script_path: str) -> ScriptInfo:
     """解析脚本路径，返回执行信息。
 
     Args:
         script_path: 脚本路径（绝对路径或相对路径）
 
     Returns:
-        包含工作目录、执行命令和脚本名称的字典
+        包含工作目录、执行命令和脚本名称的 ScriptInfo
 
     Raises:
-        ValueError: 当 script_path 为空或包含非法字符时
+        ValueError: 当 script_path 为空时
     """
     if not script_path or not script_path.strip():
         raise ValueError("script_path cannot be empty")
 
-    # 安全检查：防止命令注入
-    dangerous_chars = [';', '|', '&', '$', '`', '(', ')', '\n', '\r', '\t']
-    if any(char in script_path for char in dangerous_chars):
-        raise ValueError("script_path contains potentially dangerous characters")
+    return _parse_script_path(script_path)
 
-    path = Path(script_path)
-    script_name = path.name
 
-    if path.is_absolute():
-        working_dir = str(path.parent)
-    else:
-        working_dir = str(path.parent) or '.'
+@lru_cache(maxsize=1024)
+def _parse_script_path(script_path: str) -> ScriptInfo:
+    """解析非空的脚本路径（按路径缓存）。
 
-    # 使用引号保护路径中的空格
-    command = f'cd "{working_dir}" && bash "./{script_name}"'
+    Args:
+        script_path: 非空的脚本路径
 
-    return {
-        "working_dir": working_dir,
-        "command": command,
-        "script_name": script_name
-    }
+    Returns:
+        脚本执行信息
+    """
+    # 纯字符串解析，避免构造 Path 对象；normpath 去掉 ./ 和多余的斜杠
+    working_dir, script_name = os.path.split(os.path.normpath(script_path))
+    working_dir = working_dir or '.'
+
+    # shlex.quote 使用单引号转义，路径中的空格、$、` 等均不会被 shell 解释
+    command = f"cd {shlex.quote(working_dir)} && bash {shlex.quote('./' + script_name)}"
+
+    return ScriptInfo(
+        working_dir=working_dir,
+        command=command,
+        script_name=script_name,
+    )
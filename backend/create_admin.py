@@ -1,19 +1,25 @@
+import os
 import sys
-import bcrypt
 sys.path.insert(0, '.')
 
+import bcrypt
 from sqlalchemy.orm import Session
 from app.db.session import engine
 from app.models.user import User, UserRole
 
+ADMIN_USERNAME = "admin"
+
 db = Session(engine)
 
-admin = db.query(User).first()
-if not admin:
+# Indexed lookup on the unique username; only the id is needed
+existing = db.query(User.id).filter(User.username == ADMIN_USERNAME).first()
+if existing is None:
     password = b"admin123"
-    hashed = bcrypt.hashpw(password, bcrypt.gensalt())
+    # BCRYPT_ROUNDS lets dev/container seeding use a cheaper cost factor
+    rounds = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
     admin = User(
-        username="admin",
+        username=ADMIN_USERNAME,
         hashed_password=hashed.decode(),
         role=UserRole.ADMIN,
         is_active=True,
@@ -22,6 +28,6 @@ if not admin:
     db.commit()
     print("Admin user created: admin / admin123")
 else:
-    print(f"Admin already exists: {admin.username}")
+    print(f"Admin already exists: {ADMIN_USERNAME}")
 
 db.close()
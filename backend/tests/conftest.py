@@ -0,0 +1,60 @@
+"""Shared test fixtures."""
+import asyncio
+import sys
+
+import pytest
+import pytest_asyncio
+from pydantic import TypeAdapter
+
+from app.schemas.project import ProjectCreate, ProjectResponse, ProjectUpdate
+from app.schemas.server import ServerResponse
+from app.services import log_service
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_imports():
+    """Import the service modules and build the schemas before the first test.
+
+    Whichever test happens to run first would otherwise pay for loading the
+    SQLAlchemy models, the services and their settings.
+    """
+    import app.models.project  # noqa: F401
+    import app.models.server  # noqa: F401
+    import app.services.build_service  # noqa: F401
+    import app.services.deploy_service  # noqa: F401
+    import app.services.health_check_service  # noqa: F401
+
+    for model in (ProjectCreate, ProjectUpdate, ProjectResponse, ServerResponse):
+        model.model_rebuild(force=False)
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """Run async tests on uvloop where it is available.
+
+    uvicorn[standard] installs uvloop on Linux and macOS; elsewhere the
+    default asyncio policy is kept.
+    """
+    if sys.platform != "win32":
+        try:
+            import uvloop
+
+            return uvloop.EventLoopPolicy()
+        except ImportError:
+            pass
+    return asyncio.DefaultEventLoopPolicy()
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def close_batch_log_writers():
+    """Stop background log writers left by tests that bypass deploy()."""
+    yield
+    for writer in list(log_service._batch_writers.values()):
+        await writer.close()
+    log_service._batch_writers.clear()
+
+
+@pytest.fixture(scope="session")
+def project_create_adapter():
+    """Validator for ProjectCreate payloads, built once per session."""
+    return TypeAdapter(ProjectCreate)
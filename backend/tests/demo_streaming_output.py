@@ -4,119 +4,153 @@
 这个脚本展示了如何使用 execute_command_streaming 方法
 来获取实时的命令输出。
 """
+import asyncio
+import collections
+import itertools
+import sys
+from operator import itemgetter
+
+
+def _banner(title: str) -> str:
+    """构造分隔横幅，整块写出而不是逐行打印。"""
+    return f"{'=' * 60}\n{title}\n{'=' * 60}"
 
 
 async def demo_streaming_output():
     """演示流式输出的使用示例。"""
-    import asyncio
-
-    # 模拟部署日志记录器
+    # 模拟部署日志记录器：调用方只追加到队列，由后台任务在线程池中批量写 stdout
     class MockDeploymentLogger:
-        async def info(self, message: str) -> None:
-            print(f"INFO  {message}")
+        def __init__(self) -> None:
+            self._buf: collections.deque[str] = collections.deque()
+            self._ev = asyncio.Event()
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+
+        def info(self, message: str) -> None:
+            self.echo(f"INFO  {message}")
+
+        def error(self, message: str) -> None:
+            self.echo(f"ERROR {message}")
+
+        def warning(self, message: str) -> None:
+            self.echo(f"WARN  {message}")
+
+        def echo(self, text: str) -> None:
+            """原样输出一行文本，与日志共用同一写入顺序。"""
+            self._buf.append(text)
+            self._ev.set()
+
+        async def _run(self) -> None:
+            loop = asyncio.get_running_loop()
+            while not (self._closed and not self._buf):
+                await self._ev.wait()
+                self._ev.clear()
+                lines = []
+                while self._buf:
+                    lines.append(self._buf.popleft())
+                if lines:
+                    await loop.run_in_executor(None, sys.stdout.write, "\n".join(lines) + "\n")
+
+        async def close(self) -> None:
+            """写出剩余日志并停止后台任务。"""
+            self._closed = True
+            self._ev.set()
+            await self._task
 
-        async def error(self, message: str) -> None:
-            print(f"ERROR {message}")
+    logger = MockDeploymentLogger()
 
-        async def warning(self, message: str) -> None:
-            print(f"WARN  {message}")
+    def emit(outputs: list) -> None:
+        """按连续的相同日志方法合并输出，每组只调用一次。"""
+        for log, group in itertools.groupby(outputs, key=itemgetter(0)):
+            log("\n".join(message for _, message in group))
 
-    logger = MockDeploymentLogger()
+    async def stage_success() -> None:
+        """阶段：成功的脚本执行。"""
+        logger.echo(_banner("演示：部署脚本执行的增强日志输出"))
+
+        # 模拟脚本执行的日志输出
+        logger.info("准备执行部署脚本: restart.sh")
+        logger.info("脚本路径: /opt/app/scripts/restart.sh")
+        logger.info("工作目录: /opt/app")
+        logger.info("执行命令: cd /opt/app && bash /opt/app/scripts/restart.sh")
+
+        # 模拟实时输出
+        logger.echo("\n--- 实时输出开始 ---")
+
+        # 模拟成功的脚本执行
+        # 直接保存绑定的日志方法，构建时即完成级别分派
+        outputs = [
+            (logger.info, "[stdout] Stopping application..."),
+            (logger.info, "[stdout] Application stopped"),
+            (logger.info, "[stdout] Starting application..."),
+            (logger.info, "[stdout] Application started successfully"),
+        ]
+
+        # 合并为尽量少的日志调用，只让出一次事件循环
+        emit(outputs)
+        await asyncio.sleep(0)
+
+        logger.echo("--- 实时输出结束 ---\n")
+        logger.info("脚本执行完成，退出码: 0")
+        logger.info("部署脚本执行成功")
+
+    async def stage_unzip() -> None:
+        """阶段：解压过程。"""
+        logger.echo("\n" + _banner("演示：解压过程的增强日志输出"))
+
+        logger.info("开始解压到 /opt/app")
+        logger.info("解压命令: mkdir -p /opt/app && unzip -o /tmp/artifact.zip -d /opt/app && rm /tmp/artifact.zip")
 
-    print("=" * 60)
-    print("演示：部署脚本执行的增强日志输出")
-    print("=" * 60)
-
-    # 模拟脚本执行的日志输出
-    await logger.info("准备执行部署脚本: restart.sh")
-    await logger.info("脚本路径: /opt/app/scripts/restart.sh")
-    await logger.info("工作目录: /opt/app")
-    await logger.info("执行命令: cd /opt/app && bash /opt/app/scripts/restart.sh")
-
-    # 模拟实时输出
-    print("\n--- 实时输出开始 ---")
-
-    # 模拟成功的脚本执行
-    outputs = [
-        ("[stdout] Stopping application...", "info"),
-        ("[stdout] Application stopped", "info"),
-        ("[stdout] Starting application...", "info"),
-        ("[stdout] Application started successfully", "info"),
-    ]
-
-    for output, level in outputs:
-        if level == "info":
-            await logger.info(output)
-        await asyncio.sleep(0.1)  # 模拟延迟
-
-    print("--- 实时输出结束 ---\n")
-    await logger.info("脚本执行完成，退出码: 0")
-    await logger.info("部署脚本执行成功")
-
-    print("\n" + "=" * 60)
-    print("演示：解压过程的增强日志输出")
-    print("=" * 60)
-
-    await logger.info("开始解压到 /opt/app")
-    await logger.info("解压命令: mkdir -p /opt/app && unzip -o /tmp/artifact.zip -d /opt/app && rm /tmp/artifact.zip")
-
-    print("\n--- 实时输出开始 ---")
-
-    # 模拟解压输出
-    unzip_outputs = [
-        ("[stdout] Archive: /tmp/artifact.zip", "info"),
-        ("[stdout] inflating: /opt/app/app.py", "info"),
-        ("[stdout] inflating: /opt/app/requirements.txt", "info"),
-        ("[stdout] inflating: /opt/app/config.yaml", "info"),
-    ]
-
-    for output, level in unzip_outputs:
-        if level == "info":
-            await logger.info(output)
-        await asyncio.sleep(0.1)
-
-    print("--- 实时输出结束 ---\n")
-    await logger.info("解压完成，退出码: 0")
-
-    print("\n" + "=" * 60)
-    print("演示：失败的脚本执行")
-    print("=" * 60)
-
-    await logger.info("准备执行部署脚本: restart.sh")
-    await logger.info("脚本路径: /opt/app/scripts/restart.sh")
-    await logger.info("工作目录: /opt/app")
-    await logger.info("执行命令: cd /opt/app && bash /opt/app/scripts/restart.sh")
-
-    print("\n--- 实时输出开始 ---")
-
-    # 模拟失败的脚本执行
-    error_outputs = [
-        ("[stdout] Stopping application...", "info"),
-        ("[stderr] Error: Application not running", "error"),
-        ("[stderr] Failed to stop application", "error"),
-    ]
-
-    for output, level in error_outputs:
-        if level == "info":
-            await logger.info(output)
-        elif level == "error":
-            await logger.error(output)
-        await asyncio.sleep(0.1)
-
-    print("--- 实时输出结束 ---\n")
-    await logger.error("脚本执行完成，退出码: 1")
-    await logger.error("部署脚本执行失败")
-
-    print("\n" + "=" * 60)
-    print("演示完成")
-    print("=" * 60)
+        logger.echo("\n--- 实时输出开始 ---")
+
+        # 模拟解压输出
+        unzip_outputs = [
+            (logger.info, "[stdout] Archive: /tmp/artifact.zip"),
+            (logger.info, "[stdout] inflating: /opt/app/app.py"),
+            (logger.info, "[stdout] inflating: /opt/app/requirements.txt"),
+            (logger.info, "[stdout] inflating: /opt/app/config.yaml"),
+        ]
+
+        emit(unzip_outputs)
+        await asyncio.sleep(0)
+
+        logger.echo("--- 实时输出结束 ---\n")
+        logger.info("解压完成，退出码: 0")
+
+    async def stage_fail() -> None:
+        """阶段：失败的脚本执行。"""
+        logger.echo("\n" + _banner("演示：失败的脚本执行"))
+
+        logger.info("准备执行部署脚本: restart.sh")
+        logger.info("脚本路径: /opt/app/scripts/restart.sh")
+        logger.info("工作目录: /opt/app")
+        logger.info("执行命令: cd /opt/app && bash /opt/app/scripts/restart.sh")
+
+        logger.echo("\n--- 实时输出开始 ---")
+
+        # 模拟失败的脚本执行
+        error_outputs = [
+            (logger.info, "[stdout] Stopping application..."),
+            (logger.error, "[stderr] Error: Application not running"),
+            (logger.error, "[stderr] Failed to stop application"),
+        ]
+
+        emit(error_outputs)
+        await asyncio.sleep(0)
+
+        logger.echo("--- 实时输出结束 ---\n")
+        logger.error("脚本执行完成，退出码: 1")
+        logger.error("部署脚本执行失败")
+
+    # 三个阶段互不依赖，并发执行（输出会交错）
+    await asyncio.gather(stage_success(), stage_unzip(), stage_fail())
+
+    logger.echo("\n" + _banner("演示完成"))
+    await logger.close()
 
 
 async def demo_api_usage():
     """演示 API 的使用方法。"""
-    print("\n" + "=" * 60)
-    print("API 使用示例")
-    print("=" * 60)
 
     code_example = '''
 # 在 deploy_service.py 中的使用示例
@@ -125,16 +159,13 @@ async def _deploy_to_server(self, server: Server, artifact_path: Path):
     conn = create_ssh_connection(server)
 
     with conn:
-        # 使用流式输出执行命令
-        exit_code, stdout, stderr = conn.execute_command_streaming(
-            command="cd /opt/app && bash restart.sh",
-            on_stdout=lambda line: asyncio.create_task(
-                self.logger.info(f"[stdout] {line}")
-            ),
-            on_stderr=lambda line: asyncio.create_task(
-                self.logger.info(f"[stderr] {line}")
-            ),
-        )
+        # 使用流式输出执行命令；输出行进入队列，由单个任务按顺序写日志
+        async with CommandOutputLogger(self.logger) as output:
+            exit_code, stdout, stderr = conn.execute_command_streaming(
+                command="cd /opt/app && bash restart.sh",
+                on_stdout=output.stdout,
+                on_stderr=output.stderr,
+            )
 
         # 根据退出码记录结果
         if exit_code != 0:
@@ -145,11 +176,18 @@ async def _deploy_to_server(self, server: Server, artifact_path: Path):
             await self.logger.info("部署脚本执行成功")
 '''
 
-    print(code_example)
+    # 横幅与示例代码合并为一次写入
+    sys.stdout.write("\n" + _banner("API 使用示例") + "\n" + code_example + "\n")
 
 
 if __name__ == "__main__":
-    import asyncio
+    # uvicorn[standard] 会安装 uvloop；未安装时回退到标准事件循环
+    try:
+        import uvloop
+
+        uvloop.install()
+    except ImportError:
+        pass
 
     # 运行演示
     asyncio.run(demo_streaming_output())
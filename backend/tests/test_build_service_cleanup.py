@@ -3,29 +3,98 @@ import os
 import tempfile
 import time
 from pathlib import Path
-from unittest.mock import MagicMock, patch
 
 import pytest
 
 from app.services.build_service import cleanup_artifacts
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def temp_artifacts_dir():
-    """Create a temporary artifacts directory for testing."""
+    """Create a temporary artifacts directory shared by this module."""
     with tempfile.TemporaryDirectory() as tmpdir:
         artifacts_dir = Path(tmpdir) / "artifacts"
         artifacts_dir.mkdir()
         yield artifacts_dir
 
 
+@pytest.fixture(autouse=True)
+def _patch_settings(monkeypatch, temp_artifacts_dir):
+    """Point build_service at the temporary artifacts directory."""
+    monkeypatch.setattr(
+        "app.services.build_service.settings.artifacts_dir", str(temp_artifacts_dir)
+    )
+
+
+@pytest.fixture(autouse=True)
+def clean_artifacts(temp_artifacts_dir):
+    """Empty the shared artifacts directory before each test."""
+    for path in temp_artifacts_dir.glob("*"):
+        path.unlink()
+
+
+class RecordingLogger:
+    """Minimal async logger that records messages (cheaper than MagicMock)."""
+
+    def __init__(self) -> None:
+        self.info_calls: list[str] = []
+        self.warning_calls: list[str] = []
+
+    async def info(self, message: str) -> None:
+        self.info_calls.append(message)
+
+    async def warning(self, message: str) -> None:
+        self.warning_calls.append(message)
+
+
 @pytest.fixture
 def mock_logger():
-    """Create a mock logger."""
-    logger = MagicMock()
-    logger.info = MagicMock()
-    logger.warning = MagicMock()
-    return logger
+    """Create a recording logger."""
+    return RecordingLogger()
+
+
+def list_artifacts(artifacts_dir: Path) -> list[str]:
+    """List artifact file names with a single directory scan.
+
+    Args:
+        artifacts_dir: Directory to scan
+
+    Returns:
+        Names of artifact_*.zip files
+    """
+    with os.scandir(artifacts_dir) as entries:
+        return [
+            entry.name
+            for entry in entries
+            if entry.name.startswith("artifact_") and entry.name.endswith(".zip")
+        ]
+
+
+def create_artifacts(artifacts_dir: Path, timestamps: list[int]) -> list[Path]:
+    """Helper to create several test artifact files in one pass.
+
+    Uses raw os.open/os.write so each file costs a single open, write
+    and close. The mtime is set to the timestamp, so "newest" ordering is
+    deterministic regardless of filesystem mtime granularity.
+
+    Args:
+        artifacts_dir: Directory to create artifacts in
+        timestamps: Timestamps for the filenames
+
+    Returns:
+        Paths to created artifacts, in the given order
+    """
+    paths = []
+    for timestamp in timestamps:
+        artifact_path = artifacts_dir / f"artifact_{timestamp}.zip"
+        fd = os.open(artifact_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, f"test content {timestamp}".encode())
+            os.utime(fd, (timestamp, timestamp))
+        finally:
+            os.close(fd)
+        paths.append(artifact_path)
+    return paths
 
 
 def create_artifact(artifacts_dir: Path, timestamp: int | None = None) -> Path:
@@ -41,179 +110,150 @@ def create_artifact(artifacts_dir: Path, timestamp: int | None = None) -> Path:
     if timestamp is None:
         timestamp = int(time.time())
 
-    artifact_path = artifacts_dir / f"artifact_{timestamp}.zip"
-    artifact_path.write_text(f"test content {timestamp}")
-    return artifact_path
+    return create_artifacts(artifacts_dir, [timestamp])[0]
 
 
 def test_cleanup_keeps_latest_single_project(temp_artifacts_dir, mock_logger):
     """Test that cleanup keeps only the latest artifact for a project."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
-
-        # Create 5 artifacts with different timestamps
-        timestamps = [1000, 2000, 3000, 4000, 5000]
-        for ts in timestamps:
-            create_artifact(temp_artifacts_dir, ts)
+    # Create 5 artifacts with different timestamps
+    timestamps = [1000, 2000, 3000, 4000, 5000]
+    create_artifacts(temp_artifacts_dir, timestamps)
 
-        # Verify all files exist
-        artifacts = list(temp_artifacts_dir.glob("artifact_*.zip"))
-        assert len(artifacts) == 5
+    # Verify all files exist
+    artifacts = list_artifacts(temp_artifacts_dir)
+    assert len(artifacts) == 5
 
-        # Run cleanup with project_id=None (global cleanup)
-        # Project-specific filtering requires database integration
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
+    # Run cleanup with project_id=None (global cleanup)
+    # Project-specific filtering requires database integration
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
 
-        # Verify only the latest artifact remains
-        artifacts = list(temp_artifacts_dir.glob("artifact_*.zip"))
-        assert len(artifacts) == 1
-        assert artifacts[0].name == "artifact_5000.zip"
+    # Verify only the latest artifact remains
+    artifacts = list_artifacts(temp_artifacts_dir)
+    assert len(artifacts) == 1
+    assert artifacts[0] == "artifact_5000.zip"
 
 
 def test_cleanup_with_no_project_filter(temp_artifacts_dir, mock_logger):
     """Test cleanup without project filter keeps only one global artifact."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
+    # Create 5 artifacts
+    timestamps = [1000, 2000, 3000, 4000, 5000]
+    create_artifacts(temp_artifacts_dir, timestamps)
 
-        # Create 5 artifacts
-        timestamps = [1000, 2000, 3000, 4000, 5000]
-        for ts in timestamps:
-            create_artifact(temp_artifacts_dir, ts)
+    # Run cleanup without project filter
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
 
-        # Run cleanup without project filter
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
-
-        # Verify only the latest artifact remains
-        artifacts = list(temp_artifacts_dir.glob("artifact_*.zip"))
-        assert len(artifacts) == 1
-        assert artifacts[0].name == "artifact_5000.zip"
+    # Verify only the latest artifact remains
+    artifacts = list_artifacts(temp_artifacts_dir)
+    assert len(artifacts) == 1
+    assert artifacts[0] == "artifact_5000.zip"
 
 
 def test_cleanup_with_single_artifact(temp_artifacts_dir, mock_logger):
     """Test that cleanup doesn't delete when there's only one artifact."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
-
-        # Create only 1 artifact
-        create_artifact(temp_artifacts_dir, 1000)
+    # Create only 1 artifact
+    create_artifact(temp_artifacts_dir, 1000)
 
-        # Run cleanup
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
+    # Run cleanup
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
 
-        # Verify the artifact still exists
-        artifacts = list(temp_artifacts_dir.glob("artifact_*.zip"))
-        assert len(artifacts) == 1
+    # Verify the artifact still exists
+    artifacts = list_artifacts(temp_artifacts_dir)
+    assert len(artifacts) == 1
 
 
 def test_cleanup_with_no_artifacts(temp_artifacts_dir, mock_logger):
     """Test that cleanup handles empty artifacts directory gracefully."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
+    # Run cleanup on empty directory
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
 
-        # Run cleanup on empty directory
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
-
-        # Should not raise any errors
-        assert True
+    # Should not raise any errors
+    assert True
 
 
 def test_cleanup_logs_deleted_files(temp_artifacts_dir, mock_logger):
     """Test that cleanup logs information about deleted files."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
-
-        # Create 3 artifacts
-        create_artifact(temp_artifacts_dir, 1000)  # 50 bytes
-        create_artifact(temp_artifacts_dir, 2000)  # 50 bytes
-        create_artifact(temp_artifacts_dir, 3000)  # 50 bytes
+    # Create 3 artifacts
+    create_artifacts(temp_artifacts_dir, [1000, 2000, 3000])
 
-        # Run cleanup
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
+    # Run cleanup
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
 
-        # Verify logger was called
-        assert mock_logger.info.called
+    # Verify logger was called
+    assert mock_logger.info_calls
 
-        # Check that cleanup summary was logged
-        log_calls = [str(call) for call in mock_logger.info.call_args_list]
-        assert any("删除 2 个旧文件" in str(call) for call in log_calls)
+    # Check that cleanup summary was logged
+    assert any("删除 2 个旧文件" in msg for msg in mock_logger.info_calls)
 
 
 def test_cleanup_handles_file_errors_gracefully(temp_artifacts_dir, mock_logger):
     """Test that cleanup doesn't crash even with unexpected file states."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
-
-        # Create artifacts
-        artifact1 = create_artifact(temp_artifacts_dir, 1000)
-        artifact2 = create_artifact(temp_artifacts_dir, 2000)
-        artifact3 = create_artifact(temp_artifacts_dir, 3000)
+    # Create artifacts
+    artifact1, artifact2, artifact3 = create_artifacts(
+        temp_artifacts_dir, [1000, 2000, 3000]
+    )
 
-        # Run cleanup - should complete without errors
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
+    # Run cleanup - should complete without errors
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
 
-        # Verify cleanup completed successfully
-        # The latest artifact should remain
-        artifacts = list(temp_artifacts_dir.glob("artifact_*.zip"))
-        assert len(artifacts) == 1
-        assert artifacts[0].name == "artifact_3000.zip"
+    # Verify cleanup completed successfully
+    # The latest artifact should remain
+    artifacts = list_artifacts(temp_artifacts_dir)
+    assert len(artifacts) == 1
+    assert artifacts[0] == "artifact_3000.zip"
 
 
 def test_cleanup_size_formatting(temp_artifacts_dir, mock_logger):
     """Test that cleanup formats file sizes correctly."""
-    with patch("app.services.build_service.settings") as mock_settings:
-        mock_settings.artifacts_dir = str(temp_artifacts_dir)
-
-        # Create multiple artifacts with larger content to test MB formatting
-        # Create oldest artifact (will be deleted)
-        old_artifact = create_artifact(temp_artifacts_dir, 1000)
-        old_artifact.write_bytes(b"x" * int(1.5 * 1024 * 1024))  # 1.5 MB
-
-        # Wait a bit to ensure different mtime
-        time.sleep(0.01)
-
-        # Create newest artifact (will be kept)
-        new_artifact = create_artifact(temp_artifacts_dir, 2000)
-        new_artifact.write_bytes(b"x" * int(2.0 * 1024 * 1024))  # 2.0 MB
-
-        # Run cleanup
-        cleanup_artifacts(
-            project_id=None,
-            keep_latest=True,
-            logger=mock_logger,
-        )
-
-        # Verify logger was called with size information
-        assert mock_logger.info.called
-
-        # Check the actual log messages
-        info_messages = []
-        for call in mock_logger.info.call_args_list:
-            if call[0]:  # If there are positional args
-                info_messages.append(str(call[0][0]))
-
-        # Should log size in MB for large files (1.5 MB should be formatted as MB)
-        assert any("MB" in msg for msg in info_messages), f"No MB found in: {info_messages}"
+    # Create multiple artifacts with larger content to test MB formatting
+    # Create oldest artifact (will be deleted)
+    # Sparse files give the logical size without writing data blocks
+    old_artifact = create_artifact(temp_artifacts_dir, 1000)
+    os.truncate(old_artifact, int(1.5 * 1024 * 1024))  # 1.5 MB
+
+    # Create newest artifact (will be kept)
+    new_artifact = create_artifact(temp_artifacts_dir, 2000)
+    os.truncate(new_artifact, int(2.0 * 1024 * 1024))  # 2.0 MB
+
+    # Truncating bumps mtime, so restore the timestamps explicitly
+    os.utime(old_artifact, (1000, 1000))
+    os.utime(new_artifact, (2000, 2000))
+
+    # Run cleanup
+    cleanup_artifacts(
+        project_id=None,
+        keep_latest=True,
+        logger=mock_logger,
+    )
+
+    # Verify logger was called with size information
+    assert mock_logger.info_calls
+
+    # Check the actual log messages
+    info_messages = mock_logger.info_calls
+
+    # Should log size in MB for large files (1.5 MB should be formatted as MB)
+    assert any("MB" in msg for msg in info_messages), f"No MB found in: {info_messages}"
@@ -1,4 +1,6 @@
 """Test BuildService dependency installation."""
+import hashlib
+
 import pytest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -92,3 +94,19 @@ class TestDependencyInstallation:
 
         install_cmd = build_service._get_install_command()
         assert install_cmd is None
+
+
+def test_calculate_checksum_matches_sha256(sample_source_dir):
+    """Test artifact checksum is the SHA256 of the whole file."""
+    artifact = sample_source_dir / "app.jar"
+    # Larger than one read buffer so the digest spans several chunks
+    content = b"fake jar content" * 100_000
+    artifact.write_bytes(content)
+    build_service = BuildService(
+        source_dir=sample_source_dir,
+        build_script="mvn package",
+        output_dir="target",
+        project_type="java",
+    )
+
+    assert build_service._calculate_checksum(artifact) == hashlib.sha256(content).hexdigest()
@@ -5,68 +5,77 @@ This module tests the following changes:
 2. Server model: removed deploy_path field
 3. Deployment flow: upload to upload_path, execute restart_script_path
 """
+
 import pytest
 from pathlib import Path
-from unittest.mock import AsyncMock, MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, AsyncMock, MagicMock, Mock, patch
+
+from sqlalchemy.orm import Session
 
+from app.core.ssh import SSHConnectionPool
 from app.models.deployment import DeploymentStatus
 from app.models.project import ProjectType, HealthCheckType
-from app.models.server import AuthType
-from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
-from app.services.deploy_service import DeploymentService, DeploymentError
+from app.models.server import AuthType, Server
+from app.schemas.project import ProjectUpdate, ProjectResponse
+from app.schemas.server import ServerResponse
+from app.services.deploy_service import DeploymentService
 
-
-@pytest.fixture
-def mock_project_with_new_fields():
-    """Create a mock project with new fields."""
-    project = MagicMock()
-    project.id = 1
-    project.name = "test-project"
-    project.description = "Test project with new fields"
-    project.git_url = "https://github.com/test/repo.git"
-    project.git_token = None
-    project.git_ssh_key = None
-    project.project_type = ProjectType.FRONTEND
-    project.build_script = "npm run build"
-    project.upload_path = "/opt/uploads"
-    project.restart_script_path = "/opt/restart.sh"
-    project.output_dir = "dist"
-    project.environment = "development"
-    project.health_check_enabled = True
-    project.health_check_type = HealthCheckType.HTTP
-    project.health_check_url = "http://localhost:8080/health"
-    project.health_check_port = 8080
-    project.health_check_command = "curl -f http://localhost:8080/health || exit 1"
-    project.health_check_timeout = 30
-    project.health_check_retries = 3
-    project.health_check_interval = 5
-    project.has_git_credentials = False
-    return project
+ARTIFACT_PATH = Path("/tmp/artifact.zip")
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
+def mock_project_with_new_fields():
+    """Create a stub project with new fields.
+
+    Shared by the module; tests that change attributes use monkeypatch.
+    """
+    return SimpleNamespace(
+        id=1,
+        name="test-project",
+        description="Test project with new fields",
+        git_url="https://github.com/test/repo.git",
+        git_token=None,
+        git_ssh_key=None,
+        project_type=ProjectType.FRONTEND,
+        build_script="npm run build",
+        upload_path="/opt/uploads",
+        restart_script_path="/opt/restart.sh",
+        output_dir="dist",
+        environment="development",
+        health_check_enabled=True,
+        health_check_type=HealthCheckType.HTTP,
+        health_check_url="http://localhost:8080/health",
+        health_check_port=8080,
+        health_check_command="curl -f http://localhost:8080/health || exit 1",
+        health_check_timeout=30,
+        health_check_retries=3,
+        health_check_interval=5,
+        has_git_credentials=False,
+    )
+
+
+@pytest.fixture(scope="module")
 def mock_server_without_deploy_path():
-    """Create a mock server without deploy_path (as per new schema)."""
-    server = MagicMock()
-    server.id = 1
-    server.name = "test-server"
-    server.host = "192.168.1.100"
-    server.port = 22
-    server.username = "testuser"
-    server.auth_type = AuthType.PASSWORD
-    server.auth_value = "encrypted_password"
-    server.is_active = True
-    server.connection_status = "online"
-    # Note: server.deploy_path should NOT be present in new schema
-    # We can't assert this with MagicMock since it creates attributes on access
-    # The actual model tests verify this properly
-    return server
+    """Create a stub server without deploy_path (as per new schema)."""
+    # Plain attributes: accessing server.deploy_path would raise
+    return SimpleNamespace(
+        id=1,
+        name="test-server",
+        host="192.168.1.100",
+        port=22,
+        username="testuser",
+        auth_type=AuthType.PASSWORD,
+        auth_value="encrypted_password",
+        is_active=True,
+        connection_status="online",
+    )
 
 
 class TestProjectNewFields:
     """Test project model and schema with new fields."""
 
-    def test_project_create_schema_with_new_fields(self):
+    def test_project_create_schema_with_new_fields(self, project_create_adapter):
         """Test ProjectCreate schema accepts new fields."""
         project_data = {
             "name": "test-project",
@@ -79,13 +88,13 @@ class TestProjectNewFields:
             "environment": "development",
         }
 
-        project = ProjectCreate(**project_data)
+        project = project_create_adapter.validate_python(project_data)
 
         assert project.upload_path == "/opt/uploads"
         assert project.restart_script_path == "/opt/restart.sh"
         assert project.output_dir == "dist"
 
-    def test_project_create_schema_default_values(self):
+    def test_project_create_schema_default_values(self, project_create_adapter):
         """Test ProjectCreate schema uses correct default values."""
         project_data = {
             "name": "test-project",
@@ -94,7 +103,7 @@ class TestProjectNewFields:
             "build_script": "npm run build",
         }
 
-        project = ProjectCreate(**project_data)
+        project = project_create_adapter.validate_python(project_data)
 
         assert project.upload_path == ""  # Default is empty string
         assert project.restart_script_path == "/opt/restart.sh"  # Default value
@@ -152,16 +161,12 @@ class TestServerWithoutDeployPath:
 
     def test_server_model_excludes_deploy_path(self):
         """Verify Server model does not have deploy_path field."""
-        from app.models.server import Server
-
         # Check that deploy_path is not a column in Server model
         server_columns = [column.name for column in Server.__table__.columns]
         assert 'deploy_path' not in server_columns
 
     def test_server_response_schema_excludes_deploy_path(self):
         """Verify server response schema does not include deploy_path."""
-        from app.schemas.server import ServerResponse
-
         server_data = {
             "id": 1,
             "name": "test-server",
@@ -181,92 +186,108 @@ class TestServerWithoutDeployPath:
         assert not hasattr(server, 'deploy_path')
 
 
-class TestDeploymentFlowWithNewFields:
-    """Test deployment flow uses new fields correctly."""
+def assert_uploads_to_upload_path(conn, project, artifact_path):
+    """Artifact is uploaded into the project's upload_path."""
+    expected_remote_path = f"{project.upload_path}/{artifact_path.name}"
+    conn.upload_file.assert_called_once_with(artifact_path, expected_remote_path)
 
-    @pytest.mark.asyncio
-    async def test_deploy_to_server_uses_upload_path(
-        self, mock_project_with_new_fields, mock_server_without_deploy_path
-    ):
-        """Test that deployment uploads to project's upload_path."""
-        # Create a mock deployment
-        deployment = MagicMock()
-        deployment.id = 1
-        deployment.project = mock_project_with_new_fields
-        deployment.branch = "main"
-        deployment.server_groups = []
-        deployment.status = DeploymentStatus.PENDING
 
-        # Create mock database session
-        db = MagicMock()
+def assert_runs_restart_script(conn, project, artifact_path):
+    """The streaming command includes the restart script."""
+    assert conn.execute_command_streaming.called
+    command = conn.execute_command_streaming.call_args[0][0]
+    assert project.restart_script_path in command
 
-        # Create deployment service
-        service = DeploymentService(deployment, db)
 
-        # Mock SSH connection
-        mock_ssh_conn = MagicMock()
-        mock_ssh_conn.__enter__ = MagicMock(return_value=mock_ssh_conn)
-        mock_ssh_conn.__exit__ = MagicMock(return_value=False)
-        mock_ssh_conn.execute_command = MagicMock(return_value=(0, "", ""))
-        mock_ssh_conn.upload_file = MagicMock()
+def assert_skips_restart_script(conn, project, artifact_path):
+    """Only mkdir and unzip run when no restart script is configured."""
+    # execute_command should be called twice: mkdir and unzip
+    assert conn.execute_command.call_count == 2
+    commands = [call[0][0] for call in conn.execute_command.call_args_list]
 
-        with patch('app.services.deploy_service.create_ssh_connection', return_value=mock_ssh_conn):
-            artifact_path = Path("/tmp/artifact.zip")
+    # Verify mkdir and unzip commands target upload_path
+    assert any('mkdir' in c and project.upload_path in c for c in commands)
+    assert any('unzip -o' in c and project.upload_path in c for c in commands)
 
-            # Deploy to server
-            await service._deploy_to_server(mock_server_without_deploy_path, artifact_path)
+    # Verify execute_command_streaming was NOT called (no restart script)
+    assert not conn.execute_command_streaming.called
 
-            # Verify upload_file was called with correct remote path
-            expected_remote_path = f"{mock_project_with_new_fields.upload_path}/{artifact_path.name}"
-            mock_ssh_conn.upload_file.assert_called_once_with(artifact_path, expected_remote_path)
 
-    @pytest.mark.asyncio
-    async def test_deploy_executes_restart_script_path(
-        self, mock_project_with_new_fields, mock_server_without_deploy_path
-    ):
-        """Test that deployment executes project's restart_script_path."""
-        deployment = MagicMock()
-        deployment.id = 1
-        deployment.project = mock_project_with_new_fields
-        deployment.branch = "main"
-        deployment.server_groups = []
-        deployment.status = DeploymentStatus.PENDING
+def assert_creates_upload_directory(conn, project, artifact_path):
+    """The upload directory is created with mkdir before uploading."""
+    assert any(
+        'mkdir' in call[0][0] and project.upload_path in call[0][0]
+        for call in conn.execute_command.call_args_list
+    )
 
-        db = MagicMock()
-        service = DeploymentService(deployment, db)
 
-        # Mock SSH connection with streaming support
-        mock_ssh_conn = MagicMock()
-        mock_ssh_conn.__enter__ = MagicMock(return_value=mock_ssh_conn)
-        mock_ssh_conn.__exit__ = MagicMock(return_value=False)
-        mock_ssh_conn.execute_command = MagicMock(return_value=(0, "", ""))
-        mock_ssh_conn.execute_command_streaming = MagicMock(return_value=(0, "success", ""))
+def assert_runs_inline_command(conn, project, artifact_path):
+    """An inline shell command is passed through as the restart command."""
+    assert conn.execute_command_streaming.called
+    command = conn.execute_command_streaming.call_args[0][0]
+    assert "pm2 restart app && pm2 logs" in command
+
 
-        # Mock settings with proper object
-        mock_settings = MagicMock()
-        mock_settings.deployment_log_verbosity = 'detailed'
+@pytest.fixture
+def mock_ssh_conn():
+    """SSH connection mock usable as a context manager, with streaming support."""
+    conn = MagicMock()
+    conn.__enter__ = MagicMock(return_value=conn)
+    conn.__exit__ = MagicMock(return_value=False)
+    conn.execute_command = MagicMock(return_value=(0, "", ""))
+    conn.execute_command_streaming = MagicMock(return_value=(0, "success", ""))
+    conn.upload_file = MagicMock()
+    return conn
+
+
+@pytest.fixture
+def deploy_service_patches():
+    """Patch the SSH factory, pool and settings of deploy_service in one step.
 
-        with patch('app.services.deploy_service.create_ssh_connection', return_value=mock_ssh_conn):
-            with patch('app.services.deploy_service.settings', mock_settings):
-                artifact_path = Path("/tmp/artifact.zip")
+    A fresh pool that keeps no idle connections stands in for the shared
+    one, so mocked connections never leak between tests.
 
-                await service._deploy_to_server(mock_server_without_deploy_path, artifact_path)
+    Yields:
+        Dict of the created mocks keyed by attribute name
+    """
+    with patch.multiple(
+        "app.services.deploy_service",
+        settings=DEFAULT,
+        ssh_pool=SSHConnectionPool(idle_seconds=0),
+    ) as patches, patch("app.core.ssh.create_ssh_connection") as create_ssh_connection:
+        patches["create_ssh_connection"] = create_ssh_connection
+        patches["settings"].remote_artifact_cache_dir = ""
+        yield patches
 
-                # Verify execute_command_streaming was called with restart script
-                assert mock_ssh_conn.execute_command_streaming.called
-                call_args = mock_ssh_conn.execute_command_streaming.call_args
-                command = call_args[0][0]
 
-                # Command should include the restart_script_path
-                assert mock_project_with_new_fields.restart_script_path in command
+class TestDeploymentFlowWithNewFields:
+    """Test deployment flow uses new fields correctly."""
 
     @pytest.mark.asyncio
-    async def test_deploy_handles_empty_restart_script_path(
-        self, mock_project_with_new_fields, mock_server_without_deploy_path
+    @pytest.mark.parametrize(
+        "restart_script_path,verbosity,check",
+        [
+            pytest.param("/opt/restart.sh", "minimal", assert_uploads_to_upload_path, id="uses_upload_path"),
+            pytest.param("/opt/restart.sh", "detailed", assert_runs_restart_script, id="executes_restart_script_path"),
+            pytest.param(None, "minimal", assert_skips_restart_script, id="handles_empty_restart_script_path"),
+            pytest.param("/opt/restart.sh", "minimal", assert_creates_upload_directory, id="creates_upload_directory"),
+            # Inline shell command (contains shell operators)
+            pytest.param("pm2 restart app && pm2 logs", "detailed", assert_runs_inline_command, id="inline_restart_command"),
+        ],
+    )
+    async def test_deploy_to_server_variants(
+        self,
+        mock_project_with_new_fields,
+        mock_server_without_deploy_path,
+        deploy_service_patches,
+        mock_ssh_conn,
+        monkeypatch,
+        restart_script_path,
+        verbosity,
+        check,
     ):
-        """Test that deployment handles empty restart_script_path gracefully."""
-        # Set restart_script_path to None
-        mock_project_with_new_fields.restart_script_path = None
+        """Test _deploy_to_server against different restart script setups."""
+        monkeypatch.setattr(mock_project_with_new_fields, "restart_script_path", restart_script_path)
 
         deployment = MagicMock()
         deployment.id = 1
@@ -275,119 +296,89 @@ class TestDeploymentFlowWithNewFields:
         deployment.server_groups = []
         deployment.status = DeploymentStatus.PENDING
 
-        db = MagicMock()
+        db = Mock(spec_set=Session)
         service = DeploymentService(deployment, db)
 
-        # Mock SSH connection
-        mock_ssh_conn = MagicMock()
-        mock_ssh_conn.__enter__ = MagicMock(return_value=mock_ssh_conn)
-        mock_ssh_conn.__exit__ = MagicMock(return_value=False)
-        mock_ssh_conn.execute_command = MagicMock(return_value=(0, "", ""))
+        deploy_service_patches["create_ssh_connection"].return_value = mock_ssh_conn
+        deploy_service_patches["settings"].deployment_log_verbosity = verbosity
 
-        with patch('app.services.deploy_service.create_ssh_connection', return_value=mock_ssh_conn):
-            artifact_path = Path("/tmp/artifact.zip")
+        await service._deploy_to_server(mock_server_without_deploy_path, ARTIFACT_PATH)
 
-            # Should not raise an error
-            await service._deploy_to_server(mock_server_without_deploy_path, artifact_path)
+        check(mock_ssh_conn, mock_project_with_new_fields, ARTIFACT_PATH)
 
-            # Verify restart script was not executed
-            # execute_command should be called twice: mkdir and unzip
-            assert mock_ssh_conn.execute_command.call_count == 2
 
-            # Verify mkdir command was called
-            mkdir_calls = [call for call in mock_ssh_conn.execute_command.call_args_list
-                          if 'mkdir' in call[0][0]]
-            assert len(mkdir_calls) == 1
-            assert mock_project_with_new_fields.upload_path in mkdir_calls[0][0][0]
+class TestRemoteArtifactCache:
+    """Test artifacts are reused from the server-side cache."""
 
-            # Verify unzip command was called
-            unzip_calls = [call for call in mock_ssh_conn.execute_command.call_args_list
-                          if 'unzip' in call[0][0]]
-            assert len(unzip_calls) == 1
-            unzip_command = unzip_calls[0][0][0]
-            assert 'unzip -o' in unzip_command
-            assert mock_project_with_new_fields.upload_path in unzip_command
+    CHECKSUM = "ab" * 32
 
-            # Verify execute_command_streaming was NOT called (no restart script)
-            assert not mock_ssh_conn.execute_command_streaming.called
+    @pytest.fixture
+    def service(self, mock_project_with_new_fields, deploy_service_patches, mock_ssh_conn):
+        deploy_service_patches["create_ssh_connection"].return_value = mock_ssh_conn
+        deploy_service_patches["settings"].deployment_log_verbosity = "minimal"
+        deploy_service_patches["settings"].remote_artifact_cache_dir = "/var/cache/deploy"
+        deployment = SimpleNamespace(id=1, project=mock_project_with_new_fields)
+        return DeploymentService(deployment, Mock(spec_set=Session))
 
     @pytest.mark.asyncio
-    async def test_deploy_creates_upload_directory(
-        self, mock_project_with_new_fields, mock_server_without_deploy_path
-    ):
-        """Test that deployment creates upload directory before uploading."""
-        deployment = MagicMock()
-        deployment.id = 1
-        deployment.project = mock_project_with_new_fields
-        deployment.branch = "main"
-        deployment.server_groups = []
-        deployment.status = DeploymentStatus.PENDING
-
-        db = MagicMock()
-        service = DeploymentService(deployment, db)
+    async def test_upload_deploy_cache_hit(self, service, mock_ssh_conn):
+        """Test a cached artifact is copied into place without uploading."""
+        mock_ssh_conn.file_exists.return_value = True
 
-        # Mock SSH connection
-        mock_ssh_conn = MagicMock()
-        mock_ssh_conn.__enter__ = MagicMock(return_value=mock_ssh_conn)
-        mock_ssh_conn.__exit__ = MagicMock(return_value=False)
-        mock_ssh_conn.execute_command = MagicMock(return_value=(0, "", ""))
-        mock_ssh_conn.upload_file = MagicMock()
+        await service._upload_artifact(mock_ssh_conn, ARTIFACT_PATH, "/opt/uploads/artifact.zip", self.CHECKSUM)
 
-        with patch('app.services.deploy_service.create_ssh_connection', return_value=mock_ssh_conn):
-            artifact_path = Path("/tmp/artifact.zip")
-
-            await service._deploy_to_server(mock_server_without_deploy_path, artifact_path)
-
-            # Verify mkdir command was called
-            mkdir_calls = [call for call in mock_ssh_conn.execute_command.call_args_list
-                          if 'mkdir' in call[0][0]]
-            assert len(mkdir_calls) > 0
-
-            # Verify mkdir uses upload_path
-            mkdir_command = mkdir_calls[0][0][0]
-            assert mock_project_with_new_fields.upload_path in mkdir_command
-
-
-class TestDeploymentFlowEdgeCases:
-    """Test edge cases in deployment flow."""
+        mock_ssh_conn.file_exists.assert_called_once_with(f"/var/cache/deploy/{self.CHECKSUM}")
+        mock_ssh_conn.upload_file.assert_not_called()
+        mock_ssh_conn.execute_command.assert_called_once_with(
+            f"cp -f /var/cache/deploy/{self.CHECKSUM} /opt/uploads/artifact.zip"
+        )
 
     @pytest.mark.asyncio
-    async def test_deploy_with_inline_restart_command(
-        self, mock_project_with_new_fields, mock_server_without_deploy_path
-    ):
-        """Test deployment with inline shell command as restart script."""
-        # Set an inline command (contains shell operators)
-        mock_project_with_new_fields.restart_script_path = "pm2 restart app && pm2 logs"
+    async def test_upload_deploy_cache_miss(self, service, mock_ssh_conn):
+        """Test a missing artifact is uploaded into the cache, then copied."""
+        mock_ssh_conn.file_exists.return_value = False
+        cached = f"/var/cache/deploy/{self.CHECKSUM}"
 
-        deployment = MagicMock()
-        deployment.id = 1
-        deployment.project = mock_project_with_new_fields
-        deployment.branch = "main"
-        deployment.server_groups = []
-        deployment.status = DeploymentStatus.PENDING
+        await service._upload_artifact(mock_ssh_conn, ARTIFACT_PATH, "/opt/uploads/artifact.zip", self.CHECKSUM)
 
-        db = MagicMock()
-        service = DeploymentService(deployment, db)
+        mock_ssh_conn.upload_file.assert_called_once_with(ARTIFACT_PATH, f"{cached}.part")
+        commands = [call[0][0] for call in mock_ssh_conn.execute_command.call_args_list]
+        assert commands == [
+            "mkdir -p /var/cache/deploy",
+            f"mv -f {cached}.part {cached}",
+            f"cp -f {cached} /opt/uploads/artifact.zip",
+        ]
 
-        # Mock SSH connection
-        mock_ssh_conn = MagicMock()
-        mock_ssh_conn.__enter__ = MagicMock(return_value=mock_ssh_conn)
-        mock_ssh_conn.__exit__ = MagicMock(return_value=False)
-        mock_ssh_conn.execute_command = MagicMock(return_value=(0, "", ""))
-        mock_ssh_conn.execute_command_streaming = MagicMock(return_value=(0, "", ""))
+    @pytest.mark.asyncio
+    async def test_upload_without_checksum_skips_cache(self, service, mock_ssh_conn):
+        """Test artifacts without a checksum are uploaded directly."""
+        await service._upload_artifact(mock_ssh_conn, ARTIFACT_PATH, "/opt/uploads/artifact.zip", None)
 
-        # Mock settings with proper object
-        mock_settings = MagicMock()
-        mock_settings.deployment_log_verbosity = 'detailed'
+        mock_ssh_conn.file_exists.assert_not_called()
+        mock_ssh_conn.upload_file.assert_called_once_with(ARTIFACT_PATH, "/opt/uploads/artifact.zip")
 
-        with patch('app.services.deploy_service.create_ssh_connection', return_value=mock_ssh_conn):
-            with patch('app.services.deploy_service.settings', mock_settings):
-                artifact_path = Path("/tmp/artifact.zip")
 
-                await service._deploy_to_server(mock_server_without_deploy_path, artifact_path)
+class TestDeployToServers:
+    """Test artifacts are handed to every active server."""
 
-                # Verify command includes the inline script
-                assert mock_ssh_conn.execute_command_streaming.called
-                call_args = mock_ssh_conn.execute_command_streaming.call_args
-                command = call_args[0][0]
-                assert "pm2 restart app && pm2 logs" in command
+    @pytest.mark.asyncio
+    async def test_deploy_to_servers_forwards_artifact(self):
+        """Test that each active server gets the artifact path and checksum."""
+        servers = [
+            SimpleNamespace(name=name, host=f"{name}.local", is_active=True) for name in ("a", "b")
+        ]
+        deployment = SimpleNamespace(
+            id=9201,
+            server_groups=[SimpleNamespace(name="group", servers=servers)],
+        )
+        service = DeploymentService(deployment, Mock(spec_set=Session))
+        calls = []
+
+        async def fake_deploy(server, artifact_path, checksum):
+            calls.append((server.name, artifact_path, checksum))
+
+        service._deploy_to_server = fake_deploy
+
+        await service._deploy_to_servers(ARTIFACT_PATH, "abc123")
+
+        assert sorted(calls) == [("a", ARTIFACT_PATH, "abc123"), ("b", ARTIFACT_PATH, "abc123")]
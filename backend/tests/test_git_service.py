@@ -0,0 +1,163 @@
+"""Tests for git service helpers."""
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app.services.git_service import GitError, GitService, _fast_rmtree
+
+
+def create_tree(root: Path) -> None:
+    """Helper to create a nested directory tree with files."""
+    for i in range(3):
+        sub = root / f"dir_{i}" / "nested"
+        sub.mkdir(parents=True)
+        for j in range(20):
+            (sub / f"file_{j}.txt").write_text("content")
+    read_only = root / "dir_0" / "readonly.pack"
+    read_only.write_text("pack")
+    read_only.chmod(0o444)
+
+
+def test_fast_rmtree_removes_nested_tree(tmp_path):
+    """Test that the whole tree including read-only files is removed."""
+    root = tmp_path / "repo"
+    create_tree(root)
+
+    _fast_rmtree(root)
+
+    assert not root.exists()
+
+
+def test_fast_rmtree_does_not_follow_symlinks(tmp_path):
+    """Test that symlinked directories are unlinked, not traversed."""
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "keep.txt").write_text("keep")
+
+    root = tmp_path / "repo"
+    root.mkdir()
+    os.symlink(outside, root / "link")
+
+    _fast_rmtree(root)
+
+    assert not root.exists()
+    assert (outside / "keep.txt").exists()
+
+
+def test_fast_rmtree_missing_path(tmp_path):
+    """Test that a missing path is ignored."""
+    _fast_rmtree(tmp_path / "missing")
+
+
+@pytest.mark.asyncio
+async def test_cleanup_async_removes_repo(tmp_path):
+    """Test that cleanup_async removes the cloned repository."""
+    root = tmp_path / "repo"
+    create_tree(root)
+
+    service = GitService("https://example.com/test/repo.git")
+    service.repo_path = root
+
+    await service.cleanup_async()
+
+    assert not root.exists()
+    assert service.repo_path is None
+
+
+def test_cache_key_is_stable_per_url_and_branch():
+    """Test that the cache key depends only on URL and branch."""
+    url = "https://example.com/test/repo.git"
+
+    assert GitService(url).get_cache_key("main") == GitService(url).get_cache_key("main")
+    assert GitService(url).get_cache_key("main") != GitService(url).get_cache_key("dev")
+    assert len(GitService(url).get_cache_key()) == 16
+
+
+def test_cache_key_ignores_credentials():
+    """Test that tokens do not change the cache key."""
+    url = "https://git.internal.example/test/repo.git"
+
+    assert GitService(url, git_token="a").get_cache_key() == GitService(url, git_token="b").get_cache_key()
+
+
+def git(repo: Path, *args: str) -> str:
+    """Run a git command in ``repo`` and return its stripped stdout."""
+    result = subprocess.run(
+        ["git", "-C", str(repo), *args], capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def commit_file(repo: Path, name: str, message: str) -> str:
+    """Commit a new file and return the commit hash."""
+    (repo / name).write_text(message)
+    git(repo, "add", name)
+    git(repo, "commit", "-q", "-m", message)
+    return git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def origin_repo(tmp_path, monkeypatch):
+    """Create a local origin repository with ``main`` and ``dev`` branches."""
+    for name in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{name}_NAME", "Tester")
+        monkeypatch.setenv(f"GIT_{name}_EMAIL", "tester@example.com")
+
+    origin = tmp_path / "origin"
+    origin.mkdir()
+    git(origin, "init", "-q", "-b", "main")
+    commit_file(origin, "README.md", "Initial commit")
+    git(origin, "branch", "dev")
+    return origin
+
+
+def test_clone_reads_head_info(origin_repo, tmp_path):
+    """Test get_info parses HEAD from the NUL-separated log output."""
+    head = commit_file(origin_repo, "app.txt", "Add app\n\nWith a multi-line body")
+    service = GitService(str(origin_repo))
+
+    service.clone(target_dir=tmp_path / "clone")
+    info = service.get_info()
+
+    assert info.commit_hash == head
+    assert info.author == "Tester"
+    assert info.commit_message == "Add app\n\nWith a multi-line body"
+    assert info.branch == "main"
+
+
+@pytest.mark.parametrize("branch", [None, "main"], ids=["full_clone", "single_branch"])
+def test_get_branches_lists_remote_branches(origin_repo, tmp_path, branch):
+    """Test every remote branch is listed, without origin/HEAD."""
+    service = GitService(str(origin_repo))
+    service.clone(target_dir=tmp_path / "clone", branch=branch)
+
+    assert service.get_branches() == ["dev", "main"]
+
+
+def test_pull_latest_fetches_new_commits(origin_repo, tmp_path):
+    """Test pull_latest moves HEAD to the new origin commit."""
+    service = GitService(str(origin_repo))
+    service.clone(target_dir=tmp_path / "clone")
+    head = commit_file(origin_repo, "later.txt", "Later change")
+
+    service.pull_latest()
+
+    assert service.get_info().commit_hash == head
+
+
+def test_checkout_branch_tracks_remote_branch(origin_repo, tmp_path):
+    """Test checkout_branch creates a local branch from origin."""
+    git(origin_repo, "checkout", "-q", "dev")
+    head = commit_file(origin_repo, "dev.txt", "Dev change")
+    git(origin_repo, "checkout", "-q", "main")
+    service = GitService(str(origin_repo))
+    service.clone(target_dir=tmp_path / "clone")
+
+    service.checkout_branch("dev")
+
+    info = service.get_info()
+    assert (info.branch, info.commit_hash) == ("dev", head)
+    with pytest.raises(GitError, match="missing"):
+        service.checkout_branch("missing")
@@ -1,4 +1,8 @@
 """Tests for health check service."""
+import threading
+from functools import partial
+
+import httpx
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -15,6 +19,14 @@ def detailed_logging_mode():
         yield
 
 
+@pytest.fixture(autouse=True)
+def no_env_proxy(monkeypatch):
+    """Keep proxy settings of the host environment out of the HTTP checks."""
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.lower(), raising=False)
+
+
 @pytest.fixture
 def mock_project():
     """Create a mock project."""
@@ -49,46 +61,148 @@ def mock_logger():
     return logger
 
 
+class NoopLogger:
+    """Deployment logger stand-in for tests that never inspect log calls."""
+
+    async def info(self, *args, **kwargs) -> None:
+        pass
+
+    async def warning(self, *args, **kwargs) -> None:
+        pass
+
+    async def error(self, *args, **kwargs) -> None:
+        pass
+
+
+@pytest.fixture
+def noop_logger():
+    """Create a logger that discards every message."""
+    return NoopLogger()
+
+
+class _HealthRouter:
+    """In-memory HTTP endpoint answering every request with ``status_code``."""
+
+    def __init__(self) -> None:
+        self.status_code = 200
+        self.requests: list[httpx.Request] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(self.status_code)
+
+
+class _FakeSock:
+    """Minimal socket whose connect_ex returns ``rc``."""
+
+    rc = 0
+    closed = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def settimeout(self, timeout: float) -> None:
+        pass
+
+    def connect_ex(self, address: tuple) -> int:
+        return self.rc
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _fake_socket_class(rc: int) -> type[_FakeSock]:
+    """Build a _FakeSock subclass whose connections return ``rc``."""
+    return type("_FakeSock", (_FakeSock,), {"rc": rc})
+
+
+@pytest.fixture
+def http_router(monkeypatch):
+    """Route the service's httpx requests through an in-memory transport."""
+    router = _HealthRouter()
+    monkeypatch.setattr(
+        httpx,
+        "AsyncClient",
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(router.handle)),
+    )
+    return router
+
+
 class TestHealthCheckService:
     """Test health check service."""
 
     @pytest.mark.asyncio
-    async def test_http_health_check_success(self, mock_project, mock_server, mock_logger):
+    async def test_http_health_check_success(
+        self, mock_project, mock_server, mock_logger, http_router
+    ):
         """Test successful HTTP health check."""
-        with patch("httpx.AsyncClient") as mock_client_class:
-            # Mock successful response
-            mock_response = MagicMock()
-            mock_response.status_code = 200
-            mock_client = AsyncMock()
-            mock_client.get.return_value = mock_response
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client_class.return_value = mock_client
-
+        with patch.object(HealthCheckService, "_is_port_open", AsyncMock(return_value=True)):
             service = HealthCheckService(mock_project, mock_server, mock_logger)
             result = await service.check()
 
-            assert result is True
-            mock_logger.info.assert_called()
+        assert result is True
+        assert str(http_router.requests[0].url) == "http://192.168.1.100:8080/health"
+        mock_logger.info.assert_called()
 
     @pytest.mark.asyncio
-    async def test_http_health_check_failure(self, mock_project, mock_server, mock_logger):
+    async def test_http_health_check_failure(
+        self, mock_project, mock_server, mock_logger, http_router
+    ):
         """Test failed HTTP health check."""
-        with patch("httpx.AsyncClient") as mock_client_class:
-            # Mock failed response
-            mock_response = MagicMock()
-            mock_response.status_code = 500
-            mock_client = AsyncMock()
-            mock_client.get.return_value = mock_response
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock()
-            mock_client_class.return_value = mock_client
+        mock_project.health_check_interval = 0
+        http_router.status_code = 500
 
+        with patch.object(HealthCheckService, "_is_port_open", AsyncMock(return_value=True)):
             service = HealthCheckService(mock_project, mock_server, mock_logger)
             result = await service.check()
 
-            assert result is False
-            mock_logger.error.assert_called()
+        assert result is False
+        assert len(http_router.requests) == mock_project.health_check_retries
+        mock_logger.error.assert_called()
+
+    @pytest.mark.asyncio
+    async def test_http_health_check_skips_request_when_port_closed(
+        self, mock_project, mock_server, noop_logger, http_router
+    ):
+        """Test HTTP health check skips requests while the port is not listening."""
+        mock_project.health_check_interval = 0
+
+        with patch.object(HealthCheckService, "_is_port_open", AsyncMock(return_value=False)) as mock_probe:
+            service = HealthCheckService(mock_project, mock_server, noop_logger)
+            result = await service.check()
+
+        assert result is False
+        assert http_router.requests == []
+        mock_probe.assert_called_with("192.168.1.100", 8080, 1.0)
+
+    @pytest.mark.asyncio
+    async def test_http_health_check_skips_probe_behind_proxy(
+        self, mock_project, mock_server, noop_logger, http_router, monkeypatch
+    ):
+        """Test the direct TCP probe is skipped when requests go through a proxy."""
+        monkeypatch.setenv("HTTP_PROXY", "http://proxy.internal:3128")
+
+        with patch.object(HealthCheckService, "_is_port_open", AsyncMock(return_value=False)) as mock_probe:
+            service = HealthCheckService(mock_project, mock_server, noop_logger)
+            result = await service.check()
+
+        assert result is True
+        mock_probe.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_http_health_check_invalid_port_fails_after_retries(
+        self, mock_project, mock_server, noop_logger, http_router
+    ):
+        """Test a malformed port fails the check instead of raising."""
+        mock_project.health_check_url = "http://localhost:abc/health"
+        mock_project.health_check_interval = 0
+
+        with patch.object(HealthCheckService, "_is_port_open", AsyncMock(return_value=True)) as mock_probe:
+            service = HealthCheckService(mock_project, mock_server, noop_logger)
+            result = await service.check()
+
+        assert result is False
+        mock_probe.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_http_health_check_disabled(self, mock_project, mock_server, mock_logger):
@@ -102,68 +216,75 @@ class TestHealthCheckService:
         mock_logger.info.assert_called_with("健康检查已禁用，跳过")
 
     @pytest.mark.asyncio
-    async def test_http_health_check_missing_url(self, mock_project, mock_server, mock_logger):
-        """Test HTTP health check without URL."""
-        mock_project.health_check_url = None
-
-        service = HealthCheckService(mock_project, mock_server, mock_logger)
-
-        with pytest.raises(HealthCheckError, match="HTTP 健康检查需要配置 health_check_url"):
-            await service.check()
-
-    @pytest.mark.asyncio
-    async def test_tcp_health_check_success(self, mock_project, mock_server, mock_logger):
+    async def test_tcp_health_check_success(self, mock_project, mock_server, noop_logger):
         """Test successful TCP health check."""
         mock_project.health_check_type = HealthCheckType.TCP
+        sockets = []
 
-        with patch("socket.socket") as mock_socket_class:
-            # Mock successful connection
-            mock_socket = MagicMock()
-            mock_socket.connect_ex.return_value = 0  # Success
-            mock_socket_class.return_value = mock_socket
+        def make_socket(*args, **kwargs):
+            sock = _fake_socket_class(0)()  # Success
+            sockets.append(sock)
+            return sock
 
-            service = HealthCheckService(mock_project, mock_server, mock_logger)
+        with patch("socket.socket", make_socket):
+            service = HealthCheckService(mock_project, mock_server, noop_logger)
             result = await service.check()
 
-            assert result is True
-            mock_socket.close.assert_called()
+        assert result is True
+        assert sockets[0].closed
 
     @pytest.mark.asyncio
     async def test_tcp_health_check_failure(self, mock_project, mock_server, mock_logger):
         """Test failed TCP health check."""
         mock_project.health_check_type = HealthCheckType.TCP
+        mock_project.health_check_interval = 0
 
-        with patch("socket.socket") as mock_socket_class:
-            # Mock failed connection
-            mock_socket = MagicMock()
-            mock_socket.connect_ex.return_value = 111  # Connection refused
-            mock_socket_class.return_value = mock_socket
-
+        # Connection refused
+        with patch("socket.socket", _fake_socket_class(111)):
             service = HealthCheckService(mock_project, mock_server, mock_logger)
             result = await service.check()
 
-            assert result is False
-            mock_logger.error.assert_called()
+        assert result is False
+        mock_logger.error.assert_called()
 
     @pytest.mark.asyncio
-    async def test_tcp_health_check_missing_port(self, mock_project, mock_server, mock_logger):
-        """Test TCP health check without port."""
-        mock_project.health_check_type = HealthCheckType.TCP
-        mock_project.health_check_port = None
+    async def test_command_health_check_success(self, mock_project, mock_server, noop_logger):
+        """Test successful command health check."""
+        mock_project.health_check_type = HealthCheckType.COMMAND
 
-        service = HealthCheckService(mock_project, mock_server, mock_logger)
+        # Mock SSH connection
+        mock_ssh = MagicMock()
+        mock_ssh.execute_command_streaming.return_value = (0, "success", "")
 
-        with pytest.raises(HealthCheckError, match="TCP 健康检查需要配置 health_check_port"):
-            await service.check()
+        service = HealthCheckService(mock_project, mock_server, noop_logger, mock_ssh)
+        result = await service.check()
+
+        assert result is True
+        mock_ssh.execute_command_streaming.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_command_health_check_success(self, mock_project, mock_server, mock_logger):
-        """Test successful command health check."""
+    async def test_command_health_check_streams_output_live(
+        self, mock_project, mock_server, mock_logger
+    ):
+        """Test command output is logged while the command is still running."""
         mock_project.health_check_type = HealthCheckType.COMMAND
+        mock_project.health_check_interval = 0
+        logged = threading.Event()
+
+        async def record_info(message):
+            if message == "[stdout] warming up":
+                logged.set()
+
+        mock_logger.info.side_effect = record_info
+
+        def run_command(command, on_stdout=None, on_stderr=None):
+            on_stdout("warming up")
+            # The line must reach the logger before the command finishes
+            assert logged.wait(1.0)
+            return 0, "warming up", ""
 
-        # Mock SSH connection
         mock_ssh = MagicMock()
-        mock_ssh.execute_command_streaming.return_value = (0, "success", "")
+        mock_ssh.execute_command_streaming.side_effect = run_command
 
         service = HealthCheckService(mock_project, mock_server, mock_logger, mock_ssh)
         result = await service.check()
@@ -187,24 +308,29 @@ class TestHealthCheckService:
         mock_logger.error.assert_called()
 
     @pytest.mark.asyncio
-    async def test_command_health_check_missing_connection(self, mock_project, mock_server, mock_logger):
-        """Test command health check without SSH connection."""
-        mock_project.health_check_type = HealthCheckType.COMMAND
-
-        service = HealthCheckService(mock_project, mock_server, mock_logger, None)
-
-        with pytest.raises(HealthCheckError, match="命令健康检查需要 SSH 连接"):
-            await service.check()
-
-    @pytest.mark.asyncio
-    async def test_command_health_check_missing_command(self, mock_project, mock_server, mock_logger):
-        """Test command health check without command."""
-        mock_project.health_check_type = HealthCheckType.COMMAND
-        mock_project.health_check_command = None
-
-        mock_ssh = MagicMock()
-
-        service = HealthCheckService(mock_project, mock_server, mock_logger, mock_ssh)
-
-        with pytest.raises(HealthCheckError, match="命令健康检查需要配置 health_check_command"):
+    @pytest.mark.parametrize(
+        "check_type,missing_attr,ssh_connection,error_match",
+        [
+            pytest.param(HealthCheckType.HTTP, "health_check_url", None,
+                         "HTTP 健康检查需要配置 health_check_url", id="http_missing_url"),
+            pytest.param(HealthCheckType.TCP, "health_check_port", None,
+                         "TCP 健康检查需要配置 health_check_port", id="tcp_missing_port"),
+            pytest.param(HealthCheckType.COMMAND, None, None,
+                         "命令健康检查需要 SSH 连接", id="command_missing_connection"),
+            pytest.param(HealthCheckType.COMMAND, "health_check_command", MagicMock(),
+                         "命令健康检查需要配置 health_check_command", id="command_missing_command"),
+        ],
+    )
+    async def test_health_check_missing_configuration(
+        self, mock_project, mock_server, noop_logger,
+        check_type, missing_attr, ssh_connection, error_match,
+    ):
+        """Test health checks reject incomplete configuration."""
+        mock_project.health_check_type = check_type
+        if missing_attr:
+            setattr(mock_project, missing_attr, None)
+
+        service = HealthCheckService(mock_project, mock_server, noop_logger, ssh_connection)
+
+        with pytest.raises(HealthCheckError, match=error_match):
             await service.check()
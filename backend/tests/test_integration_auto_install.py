@@ -5,11 +5,13 @@ from unittest.mock import MagicMock, patch
 from app.services.build_service import BuildService, BuildStatus
 
 
-@pytest.fixture
-def frontend_project_dir(tmp_path):
-    """Create a mock frontend project with package.json."""
-    project_dir = tmp_path / "frontend"
-    project_dir.mkdir()
+@pytest.fixture(scope="module")
+def frontend_project_dir(tmp_path_factory):
+    """Create a mock frontend project with package.json.
+
+    No test writes into the project tree, so it is created once per module.
+    """
+    project_dir = tmp_path_factory.mktemp("frontend")
 
     # Create package.json
     package_json = project_dir / "package.json"
@@ -0,0 +1,446 @@
+"""Tests for log service."""
+import asyncio
+import threading
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.deployment import DeploymentLog
+from app.services.log_service import (
+    BatchLogWriter,
+    CommandOutputLogger,
+    DeploymentLogger,
+    LogBuffer,
+    LogLevel,
+    _batch_writers,
+    get_deployment_logs_from_db,
+    get_log_buffer,
+    remove_log_buffer,
+    stream_deployment_logs,
+)
+
+
+@pytest.fixture
+def mock_db():
+    """Create a mock database session."""
+    return MagicMock()
+
+
+class TestBatchLogWriter:
+    """Test batch log writer."""
+
+    @pytest.mark.asyncio
+    async def test_flush_uses_single_insert_and_commit(self, mock_db):
+        """Test that pending logs are written with one executemany and one commit."""
+        writer = BatchLogWriter(1, mock_db, batch_size=10, flush_interval=60)
+        now = datetime.now(timezone.utc)
+
+        for i in range(3):
+            await writer.add_log("INFO", f"line {i}", now)
+
+        mock_db.execute.assert_not_called()
+
+        await writer.flush()
+
+        mock_db.execute.assert_called_once()
+        rows = mock_db.execute.call_args[0][1]
+        assert [row["content"] for row in rows] == ["line 0", "line 1", "line 2"]
+        assert all(row["deployment_id"] == 1 for row in rows)
+        mock_db.commit.assert_called_once()
+        mock_db.add.assert_not_called()
+
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_auto_flush_on_batch_size(self, mock_db):
+        """Test that reaching the batch size triggers a flush."""
+        writer = BatchLogWriter(1, mock_db, batch_size=2, flush_interval=60)
+        now = datetime.now(timezone.utc)
+
+        await writer.add_log("INFO", "a", now)
+        await writer.add_log("INFO", "b", now)
+        await asyncio.sleep(0.01)
+
+        mock_db.execute.assert_called_once()
+        assert len(mock_db.execute.call_args[0][1]) == 2
+
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_auto_flush_on_interval(self, mock_db):
+        """Test that an elapsed flush interval triggers a flush."""
+        writer = BatchLogWriter(1, mock_db, batch_size=50, flush_interval=0)
+
+        await writer.add_log("INFO", "a", datetime.now(timezone.utc))
+        await asyncio.sleep(0.01)
+
+        mock_db.execute.assert_called_once()
+
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_add_log_does_not_write_inline(self, mock_db):
+        """Test that producers never hit the database directly."""
+        writer = BatchLogWriter(1, mock_db, batch_size=1, flush_interval=0)
+
+        await writer.add_log("INFO", "a", datetime.now(timezone.utc))
+
+        mock_db.execute.assert_not_called()
+
+        await writer.close()
+        mock_db.execute.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_flush_while_writer_waits_for_batch(self, mock_db):
+        """Test that flush writes entries the drain loop is still batching."""
+        writer = BatchLogWriter(1, mock_db, batch_size=50, flush_interval=60)
+        now = datetime.now(timezone.utc)
+
+        await writer.add_log("INFO", "a", now)
+        # Let the drain loop start waiting for the batch to fill
+        await asyncio.sleep(0)
+        await writer.add_log("INFO", "b", now)
+        await writer.flush()
+
+        mock_db.execute.assert_called_once()
+        assert [row["content"] for row in mock_db.execute.call_args[0][1]] == ["a", "b"]
+
+        await writer.close()
+        mock_db.execute.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_close_stops_writer_and_flushes(self, mock_db):
+        """Test that close persists pending logs and stops the writer task."""
+        writer = BatchLogWriter(1, mock_db, batch_size=50, flush_interval=60)
+        now = datetime.now(timezone.utc)
+
+        await writer.add_log("INFO", "a", now)
+        await writer.add_log("INFO", "b", now)
+        await writer.close()
+
+        rows = [row for call in mock_db.execute.call_args_list for row in call[0][1]]
+        assert [row["content"] for row in rows] == ["a", "b"]
+        assert writer._writer_task is None
+
+        # Logs after close are written directly
+        await writer.add_log("INFO", "c", now)
+        assert mock_db.execute.call_args[0][1][0]["content"] == "c"
+
+    @pytest.mark.asyncio
+    async def test_sqlite_raw_insert_round_trips(self):
+        """Test that the SQLite executemany path stores rows the ORM can read."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        writer = BatchLogWriter(7, db)
+        now = datetime.now(timezone.utc)
+
+        await writer.add_log("INFO", "a", now)
+        await writer.add_log("ERROR", "b", now)
+        await writer.close()
+
+        logs = db.query(DeploymentLog).order_by(DeploymentLog.id).all()
+        assert [(log.deployment_id, log.level, log.content) for log in logs] == [
+            (7, "INFO", "a"),
+            (7, "ERROR", "b"),
+        ]
+        assert logs[0].created_at.replace(tzinfo=timezone.utc) == now
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_flush_without_pending_logs(self, mock_db):
+        """Test that flushing an empty batch does not touch the database."""
+        writer = BatchLogWriter(1, mock_db)
+
+        await writer.flush()
+
+        mock_db.execute.assert_not_called()
+        mock_db.commit.assert_not_called()
+
+
+class TestDeploymentLogger:
+    """Test deployment logger."""
+
+    @pytest.mark.asyncio
+    async def test_logs_are_persisted_on_flush(self, mock_db):
+        """Test that batched logs are only written on flush."""
+        logger = DeploymentLogger(9001, mock_db)
+
+        await logger.info("hello")
+        await logger.error("boom")
+        mock_db.commit.assert_not_called()
+
+        await logger.flush()
+
+        mock_db.commit.assert_called_once()
+        rows = mock_db.execute.call_args[0][1]
+        assert [row["level"] for row in rows] == ["INFO", "ERROR"]
+        # Buffer and database share one timestamp per log line
+        assert [entry.timestamp for entry in logger.buffer.buffer] == [
+            row["created_at"] for row in rows
+        ]
+
+        await remove_log_buffer(9001)
+        assert 9001 not in _batch_writers
+
+    @pytest.mark.asyncio
+    async def test_disabled_batch_commits_immediately(self, mock_db):
+        """Test that disabling batching commits every log."""
+        logger = DeploymentLogger(9002, mock_db, enable_batch=False)
+
+        await logger.info("one")
+        await logger.info("two")
+
+        assert mock_db.commit.call_count == 2
+
+        await remove_log_buffer(9002)
+
+
+class TestCommandOutputLogger:
+    """Test streamed command output logging."""
+
+    @pytest.mark.asyncio
+    async def test_lines_are_logged_in_order(self):
+        """Test that stdout and stderr lines keep their arrival order."""
+        logger = MagicMock()
+        logger.info = AsyncMock()
+
+        async with CommandOutputLogger(logger) as output:
+            output.stdout("starting")
+            output.stderr("warning")
+            output.stdout("done")
+
+        assert [call.args[0] for call in logger.info.call_args_list] == [
+            "[stdout] starting",
+            "[stderr] warning",
+            "[stdout] done",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_oldest_lines(self):
+        """Test that a full queue drops the oldest line and reports it."""
+        logger = MagicMock()
+        logger.info = AsyncMock()
+        logger.warning = AsyncMock()
+
+        async with CommandOutputLogger(logger, maxsize=2) as output:
+            for i in range(4):
+                output.stdout(str(i))
+
+        assert [call.args[0] for call in logger.info.call_args_list] == [
+            "[stdout] 2",
+            "[stdout] 3",
+        ]
+        logger.warning.assert_awaited_once()
+        assert output.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_exit_does_not_hang_when_drain_failed(self):
+        """Test that leaving the block re-raises a drain error on a full queue."""
+        logger = MagicMock()
+        logger.info = AsyncMock(side_effect=RuntimeError("db down"))
+        logger.warning = AsyncMock()
+
+        async def run():
+            async with CommandOutputLogger(logger, maxsize=1) as output:
+                output.stdout("first")
+                # Let the drain task pick up the line and fail
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                output.stdout("second")
+
+        with pytest.raises(RuntimeError, match="db down"):
+            await asyncio.wait_for(run(), 1.0)
+
+    @pytest.mark.asyncio
+    async def test_lines_from_worker_thread_are_logged(self):
+        """Test that callbacks invoked from asyncio.to_thread are logged."""
+        logger = MagicMock()
+        logger.info = AsyncMock()
+
+        def run_command(output):
+            output.stdout("from thread")
+            output.stderr("thread error")
+
+        async with CommandOutputLogger(logger) as output:
+            await asyncio.to_thread(run_command, output)
+
+        assert [call.args[0] for call in logger.info.call_args_list] == [
+            "[stdout] from thread",
+            "[stderr] thread error",
+        ]
+
+
+class TestLogBuffer:
+    """Test in-memory log buffer."""
+
+    @pytest.mark.asyncio
+    async def test_replays_existing_entries_then_closes(self):
+        """Test that readers get buffered entries and stop on close."""
+        buffer = LogBuffer()
+        await buffer.append(LogLevel.INFO, "a")
+        await buffer.append(LogLevel.INFO, "b")
+        await buffer.close()
+
+        entries = [entry async for entry in buffer.aiter()]
+
+        assert [entry.content for entry in entries] == ["a", "b"]
+        assert [entry.seq for entry in entries] == [1, 2]
+        assert entries[0].ts_iso == entries[0].timestamp.isoformat()
+        assert entries[0].sse == f"data: INFO {entries[0].ts_iso} a\n\n".encode()
+
+    @pytest.mark.asyncio
+    async def test_from_seq_skips_seen_entries(self):
+        """Test that readers can resume after a sequence number."""
+        buffer = LogBuffer()
+        for content in ("a", "b", "c"):
+            await buffer.append(LogLevel.INFO, content)
+        await buffer.close()
+
+        entries = [entry async for entry in buffer.aiter(from_seq=2)]
+
+        assert [entry.content for entry in entries] == ["c"]
+
+    @pytest.mark.asyncio
+    async def test_live_entries_reach_all_readers(self):
+        """Test that one append wakes every waiting reader."""
+        buffer = LogBuffer()
+
+        async def read_all():
+            return [entry.content async for entry in buffer.aiter()]
+
+        readers = [asyncio.create_task(read_all()) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        await buffer.append(LogLevel.INFO, "live")
+        await buffer.close()
+
+        assert await asyncio.gather(*readers) == [["live"]] * 3
+
+    @pytest.mark.asyncio
+    async def test_keepalive_yields_none(self):
+        """Test that an idle reader receives None after the keepalive timeout."""
+        buffer = LogBuffer()
+        entries = buffer.aiter(keepalive=0.01)
+
+        assert await entries.__anext__() is None
+
+        await entries.aclose()
+
+    @pytest.mark.asyncio
+    async def test_append_from_another_event_loop(self):
+        """Test that appends from a worker-thread loop wake readers."""
+        buffer = LogBuffer()
+
+        async def read_all():
+            return [entry.content async for entry in buffer.aiter()]
+
+        reader = asyncio.create_task(read_all())
+        await asyncio.sleep(0)
+
+        async def produce():
+            await buffer.append(LogLevel.INFO, "from thread")
+            await buffer.close()
+
+        thread = threading.Thread(target=asyncio.run, args=(produce(),))
+        thread.start()
+
+        assert await asyncio.wait_for(reader, 1.0) == ["from thread"]
+        thread.join()
+
+
+    @pytest.mark.asyncio
+    async def test_readers_on_other_threads_see_every_entry(self):
+        """Test that readers on worker-thread loops register safely while appends run."""
+        buffer = LogBuffer(max_size=1000)
+        results = {}
+
+        def read_in_thread(name):
+            async def read_all():
+                return [entry.content async for entry in buffer.aiter()]
+
+            results[name] = asyncio.run(read_all())
+
+        threads = [threading.Thread(target=read_in_thread, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+
+        expected = [str(i) for i in range(500)]
+        for content in expected:
+            await buffer.append(LogLevel.INFO, content)
+            if int(content) % 50 == 0:
+                await asyncio.sleep(0.001)
+        await buffer.close()
+
+        for thread in threads:
+            await asyncio.to_thread(thread.join, 5.0)
+        assert results == {i: expected for i in range(4)}
+
+    @pytest.mark.asyncio
+    async def test_reader_resumes_from_tail_after_ring_overflow(self):
+        """Test that a slow reader skips entries evicted from the ring."""
+        buffer = LogBuffer(max_size=3)
+        for content in "abcde":
+            await buffer.append(LogLevel.INFO, content)
+        await buffer.close()
+
+        entries = [entry async for entry in buffer.aiter()]
+
+        assert [(entry.seq, entry.content) for entry in entries] == [(3, "c"), (4, "d"), (5, "e")]
+
+
+@pytest.mark.asyncio
+async def test_get_log_buffer_returns_shared_instance():
+    """Test that every caller gets the same buffer for a deployment."""
+    buffer = get_log_buffer(9004)
+
+    assert get_log_buffer(9004) is buffer
+    assert get_log_buffer(9005) is not buffer
+
+    await remove_log_buffer(9004)
+    await remove_log_buffer(9005)
+
+    assert get_log_buffer(9004) is not buffer
+    await remove_log_buffer(9004)
+
+
+@pytest.mark.asyncio
+async def test_stream_deployment_logs_formats_entries():
+    """Test SSE framing from connect to close."""
+    buffer = get_log_buffer(9003)
+    await buffer.append(LogLevel.INFO, "hello")
+    await buffer.close()
+
+    messages = [message async for message in stream_deployment_logs(9003)]
+
+    assert messages[0] == b"data: [SYSTEM] Stream connected for deployment 9003\n\n"
+    assert messages[1].startswith(b"data: INFO ")
+    assert messages[1].endswith(b" hello\n\n")
+    assert messages[-1] == b"data: [SYSTEM] Stream closed for deployment 9003\n\n"
+
+    await remove_log_buffer(9003)
+
+
+@pytest.mark.asyncio
+async def test_get_deployment_logs_from_db_returns_rows():
+    """Test that stored logs come back as ordered, limited rows."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    writer = BatchLogWriter(11, db)
+    other_writer = BatchLogWriter(12, db)
+    now = datetime.now(timezone.utc)
+    for content in ("a", "b", "c"):
+        await writer.add_log("INFO", content, now)
+    await other_writer.add_log("INFO", "other", now)
+    await writer.close()
+    await other_writer.close()
+
+    rows = get_deployment_logs_from_db(db, 11, limit=2)
+
+    assert [(row.level, row.content) for row in rows] == [("INFO", "a"), ("INFO", "b")]
+    db.close()
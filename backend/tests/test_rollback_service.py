@@ -0,0 +1,66 @@
+"""Tests for rollback service."""
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.rollback_service import RollbackService
+
+
+def make_service(servers):
+    """Create a rollback service targeting one group of servers."""
+    target = SimpleNamespace(
+        id=9101,
+        server_groups=[SimpleNamespace(name="group", servers=servers)],
+    )
+    return RollbackService(target, SimpleNamespace(id=1), MagicMock())
+
+
+def make_server(name, is_active=True):
+    return SimpleNamespace(name=name, host=f"{name}.local", is_active=is_active)
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    """Create a small artifact file."""
+    path = tmp_path / "artifact.tar.gz"
+    path.write_bytes(b"artifact-bytes")
+    return path
+
+
+@pytest.mark.asyncio
+async def test_deploy_to_servers_shares_mapped_artifact(artifact):
+    """Test that every server gets the same mapped artifact, closed afterwards."""
+    service = make_service([make_server("a"), make_server("b")])
+    seen = []
+
+    async def fake_deploy(server, artifact_path, artifact_data):
+        assert artifact_path == artifact
+        assert artifact_data[:] == b"artifact-bytes"
+        seen.append(artifact_data)
+
+    service._deploy_to_server = fake_deploy
+
+    await service._deploy_to_servers(artifact)
+
+    assert len(seen) == 2
+    assert seen[0] is seen[1]
+    assert seen[0].closed
+
+
+@pytest.mark.asyncio
+async def test_deploy_to_servers_handles_empty_artifact(tmp_path):
+    """Test that an empty artifact is uploaded as empty bytes instead of mapped."""
+    empty = tmp_path / "empty.tar.gz"
+    empty.write_bytes(b"")
+    service = make_service([make_server("a")])
+    seen = []
+
+    async def fake_deploy(server, artifact_path, artifact_data):
+        seen.append(artifact_data)
+
+    service._deploy_to_server = fake_deploy
+
+    await service._deploy_to_servers(empty)
+
+    assert seen == [b""]
@@ -0,0 +1,99 @@
+"""Tests for running deployment steps across server groups."""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.config import settings
+from app.services.server_rollout import run_on_server_groups
+
+
+class RecordingLogger:
+    """Deployment logger stand-in that keeps every message."""
+
+    def __init__(self) -> None:
+        self.messages: list[tuple[str, str]] = []
+
+    async def info(self, message: str) -> None:
+        self.messages.append(("INFO", message))
+
+    async def warning(self, message: str) -> None:
+        self.messages.append(("WARNING", message))
+
+    async def error(self, message: str) -> None:
+        self.messages.append(("ERROR", message))
+
+
+def make_group(name, servers):
+    return SimpleNamespace(name=name, servers=servers)
+
+
+def make_server(name, is_active=True):
+    return SimpleNamespace(name=name, host=f"{name}.local", is_active=is_active)
+
+
+@pytest.fixture
+def logger():
+    return RecordingLogger()
+
+
+@pytest.mark.asyncio
+async def test_servers_in_a_group_run_concurrently(logger):
+    """Test that active servers in a group are deployed at the same time."""
+    group = make_group("group", [make_server("a"), make_server("b"), make_server("idle", is_active=False)])
+    started = []
+    both_started = asyncio.Event()
+
+    async def deploy(server):
+        started.append(server.name)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), 1.0)
+
+    await run_on_server_groups([group], deploy, logger)
+
+    assert sorted(started) == ["a", "b"]
+    assert ("WARNING", "Skipping inactive server: idle") in logger.messages
+
+
+@pytest.mark.asyncio
+async def test_failure_is_raised_after_the_group_finishes(logger):
+    """Test that one failing server neither cancels its group nor starts the next."""
+    groups = [
+        make_group("first", [make_server("bad"), make_server("good")]),
+        make_group("second", [make_server("later")]),
+    ]
+    finished = []
+
+    async def deploy(server):
+        if server.name == "bad":
+            raise RuntimeError("Failed to deploy to bad")
+        await asyncio.sleep(0.01)
+        finished.append(server.name)
+
+    with pytest.raises(RuntimeError, match="bad"):
+        await run_on_server_groups(groups, deploy, logger)
+
+    assert finished == ["good"]
+    assert ("ERROR", "Failed to deploy to bad") in logger.messages
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_by_settings(logger):
+    """Test that no more than max_parallel_servers run at once."""
+    group = make_group("group", [make_server(str(i)) for i in range(5)])
+    running = 0
+    peak = 0
+
+    async def deploy(server):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    with patch.object(settings, "max_parallel_servers", 2):
+        await run_on_server_groups([group], deploy, logger)
+
+    assert peak == 2
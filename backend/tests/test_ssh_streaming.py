@@ -1,14 +1,24 @@
 """Test SSH streaming execution functionality."""
 import asyncio
+import collections
+import dataclasses
+import inspect
+import mmap
+import os
+import socket
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
+import pytest
+
+from app.core.ssh import SSHConfig, SSHConnection, SSHConnectionPool, _LineBuffer, _SFTP_CHUNK_SIZE
+from app.models.server import AuthType
 
-def test_execute_command_streaming_signature():
-    """Test that execute_command_streaming has correct signature."""
-    from app.core.ssh import SSHConnection, SSHConfig
-    from app.models.server import AuthType
 
-    # Create a mock config
-    config = SSHConfig(
+@pytest.fixture(scope="session")
+def ssh_config():
+    """SSH config shared by the tests; it is never mutated."""
+    return SSHConfig(
         host="test.example.com",
         port=22,
         username="testuser",
@@ -16,15 +26,23 @@ def test_execute_command_streaming_signature():
         auth_value="encrypted_password",
     )
 
+
+@pytest.fixture(scope="session")
+def streaming_signature():
+    """Signature of SSHConnection.execute_command_streaming."""
+    return inspect.signature(SSHConnection.execute_command_streaming)
+
+
+def test_execute_command_streaming_signature(ssh_config, streaming_signature):
+    """Test that execute_command_streaming has correct signature."""
     # Create connection instance
-    conn = SSHConnection(config)
+    conn = SSHConnection(ssh_config)
 
     # Check that the method exists
     assert hasattr(conn, 'execute_command_streaming')
 
     # Check method signature
-    import inspect
-    sig = inspect.signature(conn.execute_command_streaming)
+    sig = streaming_signature
     params = list(sig.parameters.keys())
 
     assert 'command' in params
@@ -43,50 +61,61 @@ def test_execute_command_streaming_signature():
     print("✓ execute_command_streaming signature is correct")
 
 
-def test_callback_invocation():
-    """Test that callbacks are invoked correctly."""
-    from app.core.ssh import SSHConnection, SSHConfig
-    from app.models.server import AuthType
+class MockChannel:
+    """Channel stub serving preset stdout/stderr chunks."""
 
-    config = SSHConfig(
-        host="test.example.com",
-        port=22,
-        username="testuser",
-        auth_type=AuthType.PASSWORD,
-        auth_value="encrypted_password",
-    )
+    def __init__(self, stdout_chunks, stderr_chunks=()):
+        # deque keeps dequeuing O(1) for stress-sized outputs
+        self._stdout = collections.deque(stdout_chunks)
+        self._stderr = collections.deque(stderr_chunks)
+        self.recv_sizes = []
+        # select() needs a readable file descriptor
+        self._read_fd, self._write_fd = os.pipe()
+        os.write(self._write_fd, b'x')
+
+    def settimeout(self, timeout):
+        pass
+
+    def exec_command(self, command):
+        self.command = command
+
+    def fileno(self):
+        return self._read_fd
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_ready(self):
+        return bool(self._stdout)
+
+    def recv_stderr_ready(self):
+        return bool(self._stderr)
+
+    def recv(self, nbytes):
+        self.recv_sizes.append(nbytes)
+        return self._stdout.popleft() if self._stdout else b''
+
+    def recv_stderr(self, nbytes):
+        return self._stderr.popleft() if self._stderr else b''
+
+    def recv_exit_status(self):
+        return 0
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
+def test_callback_invocation(ssh_config):
+    """Test that callbacks are invoked correctly."""
+    config = dataclasses.replace(ssh_config, read_buffer_size=8)
 
     conn = SSHConnection(config)
 
-    # Mock the exec_command to simulate streaming output
-    class MockStdout:
-        def readline(self):
-            # Simulate multiple lines of output
-            if not hasattr(self, '_lines'):
-                self._lines = [
-                    b'Line 1\n',
-                    b'Line 2\n',
-                    b'Line 3\n',
-                    b'',  # EOF
-                ]
-            return self._lines.pop(0) if self._lines else b''
-
-    class MockStderr:
-        def readline(self):
-            # Simulate error output
-            if not hasattr(self, '_lines'):
-                self._lines = [
-                    b'Error line\n',
-                    b'',  # EOF
-                ]
-            return self._lines.pop(0) if self._lines else b''
-
-    class MockChannel:
-        def recv_exit_status(self):
-            return 0
-
-    class MockStdin:
-        pass
+    # Chunks split lines across reads
+    channel = MockChannel([b'Line 1\nLi', b'ne 2\nLine 3'], [b'Error line\n'])
+    conn.client = MagicMock()
+    conn.client.get_transport.return_value.open_session.return_value = channel
 
     # Track callback invocations
     stdout_calls = []
@@ -98,12 +127,220 @@ def test_callback_invocation():
     def on_stderr(line: str) -> None:
         stderr_calls.append(line)
 
-    # We would need to mock the SSH client to fully test this
-    # For now, just verify the method accepts callbacks
-    print("✓ Callback mechanism is in place")
+    try:
+        exit_code, stdout, stderr = conn.execute_command_streaming(
+            "echo test", on_stdout=on_stdout, on_stderr=on_stderr
+        )
+    finally:
+        channel.close()
+
+    assert exit_code == 0
+    assert channel.command == "echo test"
+    assert channel.recv_sizes == [8, 8]
+    assert stdout_calls == ["Line 1", "Line 2", "Line 3"]
+    assert stderr_calls == ["Error line"]
+    assert stdout == "Line 1\nLine 2\nLine 3"
+    assert stderr == "Error line"
+
+
+def test_line_buffer_joins_long_lines_across_chunks():
+    """Test that lines spanning many chunks are emitted whole."""
+    emitted = []
+    lines = _LineBuffer(emitted.append)
+    # \r-driven progress output never contains a newline
+    progress = b"".join(b"\r%3d%%" % i for i in range(101))
+
+    for start in range(0, len(progress), 7):
+        lines.feed(progress[start:start + 7])
+    lines.feed(b"\ndone\r\nta")
+    lines.feed(b"il")
+    lines.flush()
+
+    assert emitted == [progress.decode(), "done", "tail"]
+    assert lines.lines == emitted
+
+
+def test_streaming_times_out_when_command_is_idle(ssh_config):
+    """Test that a command with no output and no exit status times out."""
+    config = dataclasses.replace(ssh_config, command_idle_timeout=0.05)
+    conn = SSHConnection(config)
+
+    class HungChannel(MockChannel):
+        closed = False
+
+        def exit_status_ready(self):
+            return False
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    channel = HungChannel([])
+    conn.client = MagicMock()
+    conn.client.get_transport.return_value.open_session.return_value = channel
+
+    with pytest.raises(socket.timeout):
+        conn.execute_command_streaming("sleep infinity")
+
+    assert channel.closed
+
+
+def test_callback_invocation_large(ssh_config):
+    """Test that a long output is streamed line by line without stalling."""
+    conn = SSHConnection(ssh_config)
+    line_count = 100_000
+    channel = MockChannel(f"Line {i}\n".encode() for i in range(line_count))
+    conn.client = MagicMock()
+    conn.client.get_transport.return_value.open_session.return_value = channel
+
+    stdout_calls = []
+
+    try:
+        exit_code, stdout, _ = conn.execute_command_streaming(
+            "seq 100000", on_stdout=stdout_calls.append
+        )
+    finally:
+        channel.close()
+
+    assert exit_code == 0
+    assert len(stdout_calls) == line_count
+    assert stdout_calls[-1] == f"Line {line_count - 1}"
+    assert stdout.count("\n") == line_count - 1
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_connect_passes_compression_flag(ssh_config, compress):
+    """Test that SSHConfig.compress is negotiated at connect time."""
+    config = dataclasses.replace(ssh_config, compress=compress)
+    conn = SSHConnection(config)
+
+    with patch("app.core.ssh.SSHClient") as client_class, patch.object(
+        SSHConfig, "decrypt_auth", return_value="password"
+    ):
+        conn.connect()
+
+    assert client_class.return_value.connect.call_args.kwargs["compress"] is compress
+
+
+def test_upload_bytes_writes_buffer_in_chunks(ssh_config):
+    """Test that upload_bytes streams a shared buffer over SFTP."""
+    conn = SSHConnection(ssh_config)
+    conn.client = MagicMock()
+    remote_file = conn.client.open_sftp.return_value.file.return_value.__enter__.return_value
+
+    data = mmap.mmap(-1, _SFTP_CHUNK_SIZE + 10)
+    data.write(b"x" * (_SFTP_CHUNK_SIZE + 10))
+
+    conn.upload_bytes(data, "/tmp/artifact.tar.gz")
+
+    chunks = [call.args[0] for call in remote_file.write.call_args_list]
+    assert [len(chunk) for chunk in chunks] == [_SFTP_CHUNK_SIZE, 10]
+    remote_file.set_pipelined.assert_called_once_with(True)
+
+    # The buffer is released after upload, so the mapping can be closed
+    data.close()
+
+
+def test_upload_file_uses_pipelined_putfo(ssh_config, tmp_path):
+    """Test that upload_file streams the open file with putfo."""
+    local = tmp_path / "artifact.zip"
+    local.write_bytes(b"artifact-bytes")
+
+    conn = SSHConnection(ssh_config)
+    conn.client = MagicMock()
+    sftp = conn.client.open_sftp.return_value
+
+    conn.upload_file(local, "/opt/uploads/artifact.zip")
+
+    sftp.put.assert_not_called()
+    sftp.putfo.assert_called_once()
+    args, kwargs = sftp.putfo.call_args
+    assert args[1] == "/opt/uploads/artifact.zip"
+    assert kwargs["file_size"] == len(b"artifact-bytes")
+    assert kwargs["confirm"] is False
+
+
+class TestSSHConnectionPool:
+    """Test SSH connection reuse."""
+
+    @staticmethod
+    def make_server():
+        return SimpleNamespace(host="test.example.com", port=22, username="testuser")
+
+    @staticmethod
+    def patch_connections():
+        return patch(
+            "app.core.ssh.create_ssh_connection",
+            side_effect=lambda server, logger=None, compress=False: MagicMock(),
+        )
+
+    @pytest.mark.asyncio
+    async def test_reuses_connection_after_success(self):
+        """Test that a returned connection is handed out again."""
+        pool = SSHConnectionPool(idle_seconds=60)
+        server = self.make_server()
+
+        with self.patch_connections() as create:
+            async with pool.acquire(server) as first:
+                pass
+            async with pool.acquire(server) as second:
+                pass
+
+        assert first is second
+        assert create.call_count == 1
+        first.connect.assert_called_once()
+        first.close.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_closes_connection_on_error(self):
+        """Test that a connection is discarded when the block fails."""
+        pool = SSHConnectionPool(idle_seconds=60)
+        server = self.make_server()
+
+        with self.patch_connections() as create:
+            with pytest.raises(RuntimeError):
+                async with pool.acquire(server) as failed:
+                    raise RuntimeError("boom")
+            async with pool.acquire(server) as fresh:
+                pass
+
+        failed.close.assert_called_once()
+        assert fresh is not failed
+        assert create.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_compressed_connections_are_pooled_separately(self):
+        """Test that a plain connection is never lent for a compressed request."""
+        pool = SSHConnectionPool(idle_seconds=60)
+        server = self.make_server()
+
+        with self.patch_connections() as create:
+            async with pool.acquire(server, compress=True) as compressed:
+                pass
+            async with pool.acquire(server) as plain:
+                pass
+            async with pool.acquire(server, compress=True) as reused:
+                pass
+
+        assert plain is not compressed
+        assert reused is compressed
+        assert [call.kwargs["compress"] for call in create.call_args_list] == [True, False]
+
+    @pytest.mark.asyncio
+    async def test_expired_connections_are_closed(self):
+        """Test that idle connections past the timeout are not reused."""
+        pool = SSHConnectionPool(idle_seconds=0.01)
+        server = self.make_server()
+
+        with self.patch_connections():
+            async with pool.acquire(server) as first:
+                pass
+            await asyncio.sleep(0.02)
+            async with pool.acquire(server) as second:
+                pass
 
+        first.close.assert_called_once()
+        assert second is not first
 
-if __name__ == "__main__":
-    test_execute_command_streaming_signature()
-    test_callback_invocation()
-    print("\nAll tests passed!")
+        pool.close_all()
+        second.close.assert_called_once()
@@ -1,54 +1,79 @@
 """Tests for upload deployment API endpoint."""
 import hashlib
 import io
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from fastapi import UploadFile
+from fastapi import BackgroundTasks, HTTPException, UploadFile
 from sqlalchemy.orm import Session
 
+from app.api.deployments import create_upload_deployment, save_upload_file, validate_upload_file
 from app.models.deployment import Deployment, DeploymentArtifact, DeploymentStatus, DeploymentType
-from app.models.project import Project, ProjectType
+from app.models.project import ProjectType
 from app.models.server import ServerGroup
-from app.models.user import User, UserRole
+from app.models.user import UserRole
+from app.services.deploy_service import DeploymentError, DeploymentService
+
+
+class FakeQuery:
+    """Query stub whose filter() chain ends in a preset row."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        return self._result
+
+    def all(self):
+        return list(self._result)
+
+
+class FakeSession:
+    """Session stub answering query() with ``result``, or ``groups`` for ServerGroup."""
+
+    def __init__(self, result=None):
+        self.result = result
+        self.groups = []
+        self.queries = []
+
+    def query(self, *entities):
+        self.queries.extend(entities)
+        if entities == (ServerGroup,):
+            return FakeQuery(self.groups)
+        return FakeQuery(self.result)
 
 
 @pytest.fixture
 def mock_db():
-    """Create a mock database session."""
-    db = MagicMock(spec=Session)
-    return db
+    """Create a stub database session for the endpoint's lookups."""
+    return FakeSession()
 
 
 @pytest.fixture
 def mock_current_user():
-    """Create a mock current user."""
-    user = MagicMock(spec=User)
-    user.id = 1
-    user.username = "testuser"
-    user.role = UserRole.ADMIN
-    return user
+    """Create a stub current user."""
+    return SimpleNamespace(id=1, username="testuser", role=UserRole.ADMIN)
 
 
 @pytest.fixture
 def mock_project():
-    """Create a mock project."""
-    project = MagicMock(spec=Project)
-    project.id = 1
-    project.name = "test-project"
-    project.project_type = ProjectType.JAVA
-    project.environment = "production"
-    return project
+    """Create a stub project."""
+    return SimpleNamespace(
+        id=1,
+        name="test-project",
+        project_type=ProjectType.JAVA,
+        environment="production",
+    )
 
 
 @pytest.fixture
 def mock_server_group():
-    """Create a mock server group."""
-    group = MagicMock(spec=ServerGroup)
-    group.id = 1
-    group.name = "test-group"
-    group.environment = "production"
-    return group
+    """Create a stub server group."""
+    return SimpleNamespace(id=1, name="test-group", environment="production")
 
 
 @pytest.fixture
@@ -60,7 +85,8 @@ def mock_upload_file_jar():
 
     # Create mock file content
     content = b"fake jar content"
-    file.read = AsyncMock(return_value=content)
+    # The endpoint reads the upload in chunks until it gets b""
+    file.read = AsyncMock(side_effect=[content[:5], content[5:], b""])
     return file, content
 
 
@@ -73,7 +99,8 @@ def mock_upload_file_zip():
 
     # Create mock file content
     content = b"fake zip content"
-    file.read = AsyncMock(return_value=content)
+    # The endpoint reads the upload in chunks until it gets b""
+    file.read = AsyncMock(side_effect=[content[:5], content[5:], b""])
     return file, content
 
 
@@ -82,23 +109,25 @@ class TestValidateUploadFile:
 
     def test_validate_jar_file_for_java_project(self):
         """Test validation passes for JAR file with Java project."""
-        from app.api.deployments import validate_upload_file
-
         # Should not raise exception
         validate_upload_file(ProjectType.JAVA, "app.jar")
 
     def test_validate_zip_file_for_frontend_project(self):
         """Test validation passes for ZIP file with frontend project."""
-        from app.api.deployments import validate_upload_file
-
         # Should not raise exception
         validate_upload_file(ProjectType.FRONTEND, "app.zip")
 
+    @pytest.mark.parametrize(
+        "project_type,filename",
+        [(ProjectType.JAVA, "app.JAR"), (ProjectType.FRONTEND, "dist.Zip")],
+    )
+    def test_validate_extension_is_case_insensitive(self, project_type, filename):
+        """Test validation accepts upper/mixed-case extensions."""
+        # Should not raise exception
+        validate_upload_file(project_type, filename)
+
     def test_validate_wrong_extension_for_java_project(self):
         """Test validation fails for non-JAR file with Java project."""
-        from app.api.deployments import validate_upload_file
-        from fastapi import HTTPException
-
         with pytest.raises(HTTPException) as exc_info:
             validate_upload_file(ProjectType.JAVA, "app.zip")
 
@@ -107,9 +136,6 @@ class TestValidateUploadFile:
 
     def test_validate_wrong_extension_for_frontend_project(self):
         """Test validation fails for non-ZIP file with frontend project."""
-        from app.api.deployments import validate_upload_file
-        from fastapi import HTTPException
-
         with pytest.raises(HTTPException) as exc_info:
             validate_upload_file(ProjectType.FRONTEND, "app.jar")
 
@@ -125,39 +151,47 @@ class TestUploadDeploymentAPI:
         self, mock_db, mock_current_user, mock_project, mock_server_group, mock_upload_file_jar
     ):
         """Test successful creation of upload deployment for Java project."""
-        from app.api.deployments import validate_upload_file
-        from fastapi import BackgroundTasks
-
         file, content = mock_upload_file_jar
 
         # Test that validation passes for correct file type
         validate_upload_file(mock_project.project_type, file.filename)
 
-        # Verify the file content was read
-        assert await file.read() == content
-        assert len(content) > 0
+        # Verify the file content is served in chunks
+        chunks = []
+        while chunk := await file.read(1 << 20):
+            chunks.append(chunk)
+        assert b"".join(chunks) == content
+        assert len(chunks) > 1
 
         # Verify the mock setup is correct
         assert mock_project.project_type == ProjectType.JAVA
         assert file.filename == "app.jar"
 
+    @pytest.mark.asyncio
+    async def test_save_upload_file_streams_to_disk(self, tmp_path, mock_upload_file_jar):
+        """Test the upload is written chunk by chunk and hashed incrementally."""
+        file, content = mock_upload_file_jar
+        dest = tmp_path / "1_app.jar"
+
+        size, checksum = await save_upload_file(file, dest)
+
+        assert dest.read_bytes() == content
+        assert size == len(content)
+        assert checksum == hashlib.sha256(content).hexdigest()
+        assert file.read.await_count == 3
+
     @pytest.mark.asyncio
     async def test_create_upload_deployment_invalid_file_type(
         self, mock_db, mock_current_user, mock_project, mock_upload_file_zip
     ):
         """Test upload deployment fails with wrong file type."""
-        from app.api.deployments import create_upload_deployment
-        from fastapi import BackgroundTasks, HTTPException
-
         file, content = mock_upload_file_zip
 
         # Change project type to JAVA but file is ZIP
         mock_project.project_type = ProjectType.JAVA
 
-        # Setup mock query
-        mock_query = MagicMock()
-        mock_query.filter.return_value.first.return_value = mock_project
-        mock_db.query.return_value = mock_query
+        # Setup query result
+        mock_db.result = mock_project
 
         mock_background_tasks = MagicMock(spec=BackgroundTasks)
 
@@ -179,13 +213,10 @@ class TestUploadDeploymentAPI:
         self, mock_db, mock_current_user, mock_upload_file_jar
     ):
         """Test upload deployment fails when project not found."""
-        from app.api.deployments import create_upload_deployment
-        from fastapi import BackgroundTasks, HTTPException
-
         file, content = mock_upload_file_jar
 
         # Setup mock to return None (project not found)
-        mock_db.query.return_value.filter.return_value.first.return_value = None
+        mock_db.result = None
 
         mock_background_tasks = MagicMock(spec=BackgroundTasks)
 
@@ -203,6 +234,30 @@ class TestUploadDeploymentAPI:
         assert exc_info.value.status_code == 404
         assert "项目不存在" in exc_info.value.detail
 
+    @pytest.mark.asyncio
+    async def test_create_upload_deployment_loads_groups_in_one_query(
+        self, mock_db, mock_current_user, mock_project, mock_server_group, mock_upload_file_jar
+    ):
+        """Test all server groups are fetched with a single IN query."""
+        file, content = mock_upload_file_jar
+        mock_db.result = mock_project
+        mock_db.groups = [mock_server_group]
+
+        with pytest.raises(HTTPException) as exc_info:
+            await create_upload_deployment(
+                project_id=1,
+                server_group_ids="1,2",
+                file=file,
+                request=MagicMock(),
+                background_tasks=MagicMock(spec=BackgroundTasks),
+                db=mock_db,
+                current_user=mock_current_user,
+            )
+
+        assert exc_info.value.status_code == 404
+        assert "服务器组 2 不存在" in exc_info.value.detail
+        assert mock_db.queries.count(ServerGroup) == 1
+
 
 class TestUploadDeploymentService:
     """Test upload deployment in deployment service."""
@@ -210,9 +265,6 @@ class TestUploadDeploymentService:
     @pytest.mark.asyncio
     async def test_upload_deploy_flow(self):
         """Test upload deployment flow in service."""
-        from app.models.deployment import DeploymentArtifact
-        from app.services.deploy_service import DeploymentService
-
         # Create mock deployment with artifact
         mock_deployment = MagicMock(spec=Deployment)
         mock_deployment.id = 1
@@ -252,9 +304,6 @@ class TestUploadDeploymentService:
     @pytest.mark.asyncio
     async def test_upload_deploy_with_health_check(self):
         """Test upload deployment flow with health check."""
-        from app.models.deployment import DeploymentArtifact
-        from app.services.deploy_service import DeploymentService
-
         # Create mock deployment with artifact
         mock_deployment = MagicMock(spec=Deployment)
         mock_deployment.id = 1
@@ -296,8 +345,6 @@ class TestUploadDeploymentService:
     @pytest.mark.asyncio
     async def test_upload_deploy_no_artifact(self):
         """Test upload deployment fails when no artifact found."""
-        from app.services.deploy_service import DeploymentService, DeploymentError
-
         # Create mock deployment without artifact
         mock_deployment = MagicMock(spec=Deployment)
         mock_deployment.id = 1
@@ -6,33 +6,33 @@ from app.utils.script_utils import get_script_execution_info
 def test_get_script_execution_info_absolute_path():
     """测试绝对路径解析"""
     info = get_script_execution_info("/app/dir/script.sh")
-    assert info["working_dir"] == "/app/dir"
-    assert info["command"] == 'cd "/app/dir" && bash "./script.sh"'
-    assert info["script_name"] == "script.sh"
+    assert info.working_dir == "/app/dir"
+    assert info.command == "cd /app/dir && bash ./script.sh"
+    assert info.script_name == "script.sh"
 
 
 def test_get_script_execution_info_relative_path_with_dot():
     """测试带 ./ 的相对路径"""
     info = get_script_execution_info("./scripts/restart.sh")
-    assert info["working_dir"] == "scripts"
-    assert info["command"] == 'cd "scripts" && bash "./restart.sh"'
-    assert info["script_name"] == "restart.sh"
+    assert info.working_dir == "scripts"
+    assert info.command == "cd scripts && bash ./restart.sh"
+    assert info.script_name == "restart.sh"
 
 
 def test_get_script_execution_info_simple_name():
     """测试仅文件名"""
     info = get_script_execution_info("restart.sh")
-    assert info["working_dir"] == "."
-    assert info["command"] == 'cd "." && bash "./restart.sh"'
-    assert info["script_name"] == "restart.sh"
+    assert info.working_dir == "."
+    assert info.command == "cd . && bash ./restart.sh"
+    assert info.script_name == "restart.sh"
 
 
 def test_get_script_execution_info_nested_path():
     """测试嵌套目录的绝对路径"""
     info = get_script_execution_info("/application/back/charge-back/restartFromTemp.sh")
-    assert info["working_dir"] == "/application/back/charge-back"
-    assert info["command"] == 'cd "/application/back/charge-back" && bash "./restartFromTemp.sh"'
-    assert info["script_name"] == "restartFromTemp.sh"
+    assert info.working_dir == "/application/back/charge-back"
+    assert info.command == "cd /application/back/charge-back && bash ./restartFromTemp.sh"
+    assert info.script_name == "restartFromTemp.sh"
 
 
 def test_get_script_execution_info_empty_string():
@@ -50,30 +50,23 @@ def test_get_script_execution_info_whitespace_only():
 def test_get_script_execution_info_path_with_spaces():
     """测试包含空格的路径"""
     info = get_script_execution_info("/app/my dir/script.sh")
-    assert info["working_dir"] == "/app/my dir"
-    assert info["command"] == 'cd "/app/my dir" && bash "./script.sh"'
-    assert info["script_name"] == "script.sh"
+    assert info.working_dir == "/app/my dir"
+    assert info.command == "cd '/app/my dir' && bash ./script.sh"
+    assert info.script_name == "script.sh"
 
 
-def test_get_script_execution_info_dangerous_chars():
-    """测试包含危险字符的路径输入"""
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("script.sh; rm -rf /")
+def test_get_script_execution_info_quotes_shell_metacharacters():
+    """测试 shell 元字符被单引号转义"""
+    info = get_script_execution_info("/app/$(whoami)/script.sh; reboot")
+    assert info.working_dir == "/app/$(whoami)"
+    assert info.command == "cd '/app/$(whoami)' && bash './script.sh; reboot'"
 
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("script.sh|cat /etc/passwd")
+    info = get_script_execution_info("/app/it's/run`id`.sh")
+    assert info.command == "cd '/app/it'\"'\"'s' && bash './run`id`.sh'"
 
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("script.sh&malicious")
 
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("script.sh`whoami`")
-
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("script.sh$(echo hack)")
-
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("/path/to/script\ninject")
-
-    with pytest.raises(ValueError, match="contains potentially dangerous characters"):
-        get_script_execution_info("/path/to/script\tinject")
+def test_get_script_execution_info_is_cached():
+    """测试相同路径复用缓存结果"""
+    first = get_script_execution_info("/app/cached/restart.sh")
+    second = get_script_execution_info("/app/cached/restart.sh")
+    assert first is second